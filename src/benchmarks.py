@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.stub_server import StubConfig, start_stub_server
+
+DEFAULT_SIZES = [1_000, 10_000]
+DEFAULT_BASELINE_PATH = "benchmarks/baseline.json"
+
+# Filter thresholds used instead of the inputs worksheet, so the benchmarks never need sheets access
+SYNTHETIC_INPUTS = {
+    "label_watchlist": ["Watchlist Label"],
+    "label_blocklist": ["Blocked Label"],
+    "artist_blocklist": ["Blocked Artist"],
+    "song_blocklist_urls": [],
+    "playlist_list": [],
+    "platform_genre_country_chart_tuples": [],
+    "max_artists_on_track": 2,
+    "max_spotify_followers": 50_000,
+    "max_streams": 1_000_000,
+    "min_average_streams_if_above_0": 100,
+    "max_streams_on_song_in_catalogue": 1_000_000,
+    "max_tiktok_followers": 100_000,
+    "minimum_spotify_followers_if_100k_monthly_listeners": 1_000,
+    "max_percent_of_streams_on_one_day": 50,
+}
+
+# The Spotify client is built when the pipeline modules are imported, it only needs credentials that look valid as the
+# benchmarks never create playlists
+DUMMY_SPOTIFY_ENV = {
+    "SPOTIPY_CLIENT_ID": "benchmark",
+    "SPOTIPY_CLIENT_SECRET": "benchmark",
+    "SPOTIPY_REDIRECT_URI": "http://127.0.0.1/callback",
+}
+
+
+def setup_offline_environment() -> None:
+    """
+    Point the Soundcharts calls at a local stub server and use synthetic inputs, this must run before the modules
+    under benchmark are imported.
+    """
+    output_folder = tempfile.mkdtemp(prefix="soundcharts_benchmarks_")
+    os.environ["OUTPUT_FOLDER"] = output_folder
+    os.environ["LOGS_FOLDER"] = output_folder
+    for name, value in DUMMY_SPOTIFY_ENV.items():
+        os.environ.setdefault(name, value)
+
+    server = start_stub_server(StubConfig(latency=0, latency_jitter=0), port=0)
+    os.environ["API_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+
+    from src import input_lists
+    for name, value in SYNTHETIC_INPUTS.items():
+        setattr(input_lists, name, value)
+
+
+def make_candidate_df(size: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Enriched candidate rows as produced by get_all_song_info, with one artist per five songs capped at 2000 artists
+    so the TikTok lookups stay a small part of the filter time.
+    """
+    song_uuids = [f"song-{i}" for i in range(size)]
+    artist_uuids = [f"artist-{i}" for i in rng.integers(0, max(1, min(size // 5, 2_000)), size)]
+    return pd.DataFrame({
+        "song_uuid": song_uuids,
+        "url": [f"https://app.soundcharts.com/app/song/{uuid}/trends" for uuid in song_uuids],
+        "main_artist_uuid": artist_uuids,
+        "total_streams": rng.integers(0, 2_000_000, size),
+        "today_streams": rng.integers(0, 50_000, size),
+        "day_1-3_average": rng.integers(0, 50_000, size),
+        "main_artist_spotify_followers": rng.integers(0, 100_000, size),
+        "main_artist_spotify_monthly_listeners": rng.integers(0, 500_000, size),
+    })
+
+
+def make_audience_df(rng: np.random.Generator, days: int = 90) -> pd.DataFrame:
+    """
+    Audience history as returned by get_song_audience, most recent day first.
+    """
+    today = date.today()
+    daily_streams = rng.integers(0, 10_000, days)
+    total_streams = np.cumsum(daily_streams[::-1])[::-1]
+    df = pd.DataFrame({
+        "date": [str(today - timedelta(days=i)) for i in range(days)],
+        "total_streams": total_streams,
+    })
+    df["daily_streams"] = df["total_streams"].diff().fillna(0)
+    df["daily_streams"] = df["daily_streams"].shift(-1) * -1
+    return df
+
+
+def make_tracklist_df(size: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Tracklists of one playlist over several crawl dates with every song appearing on two of them, built like the
+    fetched tracklists with categorical playlist metadata and string crawl dates.
+    """
+    from src.playlists.playlists import convert_tracklist_to_df, concat_tracklist_dfs
+
+    crawl_dates = [f"{date.today() - timedelta(days=i)}T00:00:00+00:00" for i in range(30)]
+    song_uuids = np.repeat([f"song-{i}" for i in range(size)], 2)
+    song_crawl_dates = rng.choice(crawl_dates, len(song_uuids))
+    related = {"playlist": {"name": "Benchmark Playlist", "uuid": "playlist-0", "platform": "spotify"}}
+
+    tracklist_dfs = []
+    for crawl_date in crawl_dates:
+        tracklist_song_uuids = song_uuids[song_crawl_dates == crawl_date].tolist()
+        columns = {"song_name": [f"Song {uuid}" for uuid in tracklist_song_uuids], "song_uuid": tracklist_song_uuids,
+                   "position": list(range(1, len(tracklist_song_uuids) + 1))}
+        tracklist_dfs.append(convert_tracklist_to_df(columns, {**related, "date": crawl_date}))
+    return concat_tracklist_dfs(tracklist_dfs)
+
+
+def make_song_dataframes(size: int, rng: np.random.Generator) -> tuple[dict[str, pd.DataFrame], dict[str, str]]:
+    """
+    A year of history for one song per hundred candidates, the size of a large catalogue report.
+    """
+    dataframes = {}
+    for i in range(max(1, size // 100)):
+        df = make_audience_df(rng, days=365).set_index("date")
+        dataframes[f"song-{i}"] = df
+    return dataframes, {uuid: f"Song {uuid}" for uuid in dataframes}
+
+
+def get_benchmarks() -> dict:
+    """
+    Each benchmark builds its input for a size and returns the function to time.
+    """
+    from src import filters
+    from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates, \
+        x_percent_of_streams_are_from_one_day_in_last_14_days
+    from src.playlists.playlists import add_accurate_date_added_to_columns
+    from src.report import combine_song_dataframes
+    from src.song_info import get_metrics_df
+
+    def follower_filters(size, rng):
+        df = make_candidate_df(size, rng)
+
+        # The TikTok followers are fetched from the stub server before timing, so only the filtering is measured
+        tiktok_followers = dict(zip(df["main_artist_uuid"], filters.fetch_tiktok_followers_threaded(df)))
+
+        def run():
+            fetch_tiktok_followers_threaded = filters.fetch_tiktok_followers_threaded
+            filters.fetch_tiktok_followers_threaded = lambda df: df["main_artist_uuid"].map(tiktok_followers)
+            try:
+                return apply_follower_stream_listeners_filters_and_drop_duplicates(df.copy())
+            finally:
+                filters.fetch_tiktok_followers_threaded = fetch_tiktok_followers_threaded
+
+        return run
+
+    def metrics(size, rng):
+        audience_dfs = [make_audience_df(rng) for _ in range(size)]
+        return lambda: [get_metrics_df(df, f"song-{i}") for i, df in enumerate(audience_dfs)]
+
+    def spike_filter(size, rng):
+        audience_dfs = [make_audience_df(rng) for _ in range(size)]
+        return lambda: [x_percent_of_streams_are_from_one_day_in_last_14_days(df, 50) for df in audience_dfs]
+
+    def date_added(size, rng):
+        df = make_tracklist_df(size, rng)
+        return lambda: add_accurate_date_added_to_columns(df.copy())
+
+    def combine(size, rng):
+        dataframes, song_names = make_song_dataframes(size, rng)
+        return lambda: combine_song_dataframes(dataframes, song_names)
+
+    return {
+        "apply_follower_stream_listeners_filters_and_drop_duplicates": follower_filters,
+        "get_metrics_df": metrics,
+        "x_percent_of_streams_are_from_one_day_in_last_14_days": spike_filter,
+        "add_accurate_date_added_to_columns": date_added,
+        "combine_song_dataframes": combine,
+    }
+
+
+def run_benchmarks(sizes: list[int], repeats: int, selected: list[str] | None = None) -> dict:
+    results = {}
+    for name, make_benchmark in get_benchmarks().items():
+        if selected and name not in selected:
+            continue
+
+        results[name] = {}
+        for size in sizes:
+            func = make_benchmark(size, np.random.default_rng(size))
+
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+
+            results[name][str(size)] = {"min_s": round(min(timings), 4),
+                                        "median_s": round(statistics.median(timings), 4)}
+            print(f"{name} [{size}]: min {min(timings):.4f}s, median {statistics.median(timings):.4f}s")
+
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Get the benchmarks whose best time is slower than the baseline by more than the tolerance.
+    """
+    regressions = []
+    for name, sizes in results.items():
+        for size, timing in sizes.items():
+            baseline_timing = baseline.get("results", {}).get(name, {}).get(size)
+            if baseline_timing and timing["min_s"] > baseline_timing["min_s"] * (1 + tolerance):
+                regressions.append(f"{name} [{size}]: {timing['min_s']}s vs baseline {baseline_timing['min_s']}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the filtering and metrics hot paths on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Numbers of songs to benchmark, e.g. 1000 10000 100000")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Names of the benchmarks to run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown compared to the baseline before failing, 0.2 is 20%%")
+    args = parser.parse_args()
+
+    setup_offline_environment()
+    results = run_benchmarks(args.sizes, args.repeats, args.only)
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline = {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "results": results,
+        }
+        baseline_path.write_text(json.dumps(baseline, indent=2))
+        print(f"Saved baseline to {baseline_path}")
+        return
+
+    if baseline_path.exists():
+        regressions = compare_to_baseline(results, json.loads(baseline_path.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
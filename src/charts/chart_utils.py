@@ -25,15 +25,15 @@ def get_filtered_sluglist(slug_list: list[str], keyword_list: list[str], exclusi
     return result
 
 
-def set_extra_values_for_df(df: pd.DataFrame, country_code: str, country_name: str, platform: str, uuid: str, toc: int,
-                            slug: str):
-    df["country"] = country_name
-    df["country_code"] = country_code
-    df["platform"] = platform
-    df["song_uuid"] = uuid
-    df["time_on_chart"] = toc
-    df["chart_slug"] = slug
-    return df
+def set_extra_values_for_row(row: dict, country_code: str, country_name: str, platform: str, uuid: str, toc: int,
+                             slug: str) -> dict:
+    row["country"] = country_name
+    row["country_code"] = country_code
+    row["platform"] = platform
+    row["song_uuid"] = uuid
+    row["time_on_chart"] = toc
+    row["chart_slug"] = slug
+    return row
 
 
 def translate_input_genre_into_keywords_and_exlusion_list(genre: str) -> tuple[list[str], list[str]]:
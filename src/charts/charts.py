@@ -1,18 +1,26 @@
+from typing import Iterator
+
 import pandas as pd
 import requests
 from wrapt_timeout_decorator import wrapt_timeout_decorator
 
-from src.charts.chart_utils import filter_charts_by_doc, set_extra_values_for_df, get_uuid_toc_streams_tuples_from_items, \
+from src.charts.chart_utils import filter_charts_by_doc, set_extra_values_for_row, get_uuid_toc_streams_tuples_from_items, \
     translate_input_genre_into_keywords_and_exlusion_list, get_filtered_sluglist, country_code_to_name_dict
 from src.sheets_utils import drop_songs_that_appeared_in_past
 from src.credentials_key_info import BASE_API_URL, credentials
+from src.language import get_title_languages
 from src.logging_config import logger
 from src.session_manager import session
-from src.song_info import get_all_song_info
+from src.song_info import get_song_info_rows
 from src.common_columns import COMMON_COLUMNS
-from src.input_lists import max_streams, platform_genre_country_chart_tuples
-from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates
+from src import input_lists
+from src.history import history
+from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates, log_dropped_rows, \
+    record_passed_songs
 from src.output import process_scrape_output
+from src.pagination import iter_pages
+from src.pipeline import enrich_as_discovered
+from src.run_journal import get_run_journal
 
 chart_columns = [
                     "country",
@@ -22,97 +30,98 @@ chart_columns = [
                 ] + COMMON_COLUMNS
 
 
-@wrapt_timeout_decorator.timeout(60)
-def scrape_charts(slug_list: list, country_code: str, platform: str) -> pd.DataFrame:
-    song_df_ls = []
+def discover_new_chart_songs(slug_list: list) -> Iterator[tuple[str, str, int]]:
+    """
+    Yield the slug, uuid and time on chart of songs new to each chart as the chart pages are fetched.
+    """
     for slug in slug_list:
         logger.info(f"Scraping {slug}".center(50, "-"))
 
-        # Get uuid, toc, streams for songs on chart
-        uuid_toc_streams_for_songs_on_chart: list[tuple[str, int, int]] = get_uuid_toc_streams_for_songs_on_chart(slug)
+        for page in iter_uuid_toc_streams_pages_for_songs_on_chart(slug):
+            # Early Filtering
+            # Get rid of songs with more than 1 day on chart
+            uuid_toc_streams: list[tuple[str, int, int]] = filter_charts_by_doc(1, page)
 
-        # Early Filtering
-        # Get rid of songs with more than 1 day on chart
-        uuid_toc_streams: list[tuple[str, int, int]] = filter_charts_by_doc(1, uuid_toc_streams_for_songs_on_chart)
+            # Remove songs with greater than max_streams
+            for uuid, toc, streams in uuid_toc_streams:
+                if streams < input_lists.max_streams:
+                    yield slug, uuid, toc
 
-        logger.debug("Songs with 1 day on chart".center(50, "*"))
-        logger.debug(uuid_toc_streams)
-        logger.debug("".center(50, "*"))
 
-        # Remove songs with greater than max_streams
-        uuid_toc_streams = [(uuid, toc, streams) for uuid, toc, streams in uuid_toc_streams if
-                            streams < max_streams]
+def enrich_chart_song(song: tuple[str, str, int], country_code: str, platform: str) -> list[dict]:
+    slug, uuid, toc = song
 
-        # Get all song info for each song
-        for uuid, toc, streams in uuid_toc_streams:
-            song_df = get_all_song_info(uuid)
-            country_name = country_code_to_name_dict[country_code]
-            # Set extra values for the df
-            song_df = set_extra_values_for_df(song_df, country_code, country_name, platform, uuid, toc, slug)
-            song_df_ls.append(song_df)
+    # Reuse the song if it was already finished earlier in today's run
+    journal_key = f"{slug}:{uuid}"
+    rows = get_run_journal().get("chart", journal_key)
 
-    if not song_df_ls:
-        return pd.DataFrame()
+    if rows is None:
+        country_name = country_code_to_name_dict[country_code]
+        # Set extra values for the song
+        rows = [set_extra_values_for_row(row, country_code, country_name, platform, uuid, toc, slug)
+                for row in get_song_info_rows(uuid, source="chart")]
+        get_run_journal().record("chart", journal_key, rows)
+    else:
+        # Candidates not yet flushed to the history when the earlier run crashed are recorded again
+        history.record_candidates(rows, "chart", "enriched")
 
-    return pd.concat(song_df_ls, ignore_index=True)
+    return rows
 
 
-def get_uuid_toc_streams_for_songs_on_chart(chart_slug: str, date: str | None = None) -> list[tuple[str, int, int]]:
+@wrapt_timeout_decorator.timeout(60)
+def scrape_charts(slug_list: list, country_code: str, platform: str) -> pd.DataFrame:
+    # Songs are enriched while the remaining chart pages are still being fetched
+    song_rows = enrich_as_discovered(discover_new_chart_songs(slug_list),
+                                     lambda song: enrich_chart_song(song, country_code, platform))
+    return song_rows.to_df()
+
+
+def iter_uuid_toc_streams_pages_for_songs_on_chart(chart_slug: str,
+                                                   date: str | None = None) -> Iterator[list[tuple[str, int, int]]]:
+    """
+    Yield the uuid, time on chart and streams of the songs on each page of the chart as it is fetched.
+    """
     logger.debug(f"Getting chart data for {chart_slug}")
 
-    if not date:
-        _next: str = BASE_API_URL + "/v2.14/chart/song/" + chart_slug + "/ranking/latest?offset=0&limit=100"
-    else:
-        response: requests.Response = session.get(BASE_API_URL + "/v2/chart/song/" + chart_slug + "/available-rankings?offset=0&limit=100",
-                                                  headers=credentials)
-        date_times = response.json()["items"]
-        for dt in date_times:
-            if date in str(dt):
-                date = dt
-                logger.warn(date)
-                break
-        _next: str = BASE_API_URL + "/v2.14/chart/song/" + chart_slug + "/ranking/" + date + "?offset=0&limit=100"
-
-    result: list[tuple[str, int, int]] = []
-    while _next:
-        try:
-            response: requests.Response = session.get(
-                _next,
-                headers=credentials,
-            )
-            items: list[dict] = response.json().get("items")
-            list_of_uuid_toc_streams_tuples: list[tuple[str, int, int]] = get_uuid_toc_streams_tuples_from_items(items)
-            result += list_of_uuid_toc_streams_tuples
-
-            _next: str = response.json()["page"]["next"]
-            if _next:
-                _next = _next.removeprefix("/api")
-                _next = BASE_API_URL + _next
-
-        except Exception as e:
-            logger.debug(f"Error in get_uuid_toc_streams_for_songs_on_chart {e}")
-            return []
+    try:
+        if not date:
+            url: str = BASE_API_URL + "/v2.14/chart/song/" + chart_slug + "/ranking/latest"
+        else:
+            response: requests.Response = session.get(BASE_API_URL + "/v2/chart/song/" + chart_slug + "/available-rankings?offset=0&limit=100",
+                                                      headers=credentials)
+            date_times = response.json()["items"]
+            for dt in date_times:
+                if date in str(dt):
+                    date = dt
+                    logger.warn(date)
+                    break
+            url: str = BASE_API_URL + "/v2.14/chart/song/" + chart_slug + "/ranking/" + date
+
+        for page in iter_pages(url):
+            items: list[dict] = page.get("items")
+            get_title_languages().prime(item["song"]["name"] for item in items or [])
+            yield get_uuid_toc_streams_tuples_from_items(items)
 
+    except Exception as e:
+        logger.debug(f"Error in get_uuid_toc_streams_for_songs_on_chart {e}")
+
+
+def get_uuid_toc_streams_for_songs_on_chart(chart_slug: str, date: str | None = None) -> list[tuple[str, int, int]]:
+    result: list[tuple[str, int, int]] = [
+        uuid_toc_streams for page in iter_uuid_toc_streams_pages_for_songs_on_chart(chart_slug, date)
+        for uuid_toc_streams in page
+    ]
     logger.debug(f"Got {len(result)} songs from chart {chart_slug}")
     return result
 
 
 def get_all_chart_slugs(platform: str, country_code: str) -> list[str] | None:
     try:
-        _next = BASE_API_URL + f"/v2/chart/song/by-platform/{platform}?countryCode={country_code.lower()}&offset=0&limit=100"
+        url = BASE_API_URL + f"/v2/chart/song/by-platform/{platform}?countryCode={country_code.lower()}"
 
         slug_result_list = []
-        while _next:
-            response: requests.Response = session.get(_next, headers=credentials)
-            response_json: dict = response.json()
-
-            _next = response_json.get("page")["next"]
-
-            if _next:
-                _next = _next.removeprefix("/api")
-                _next = BASE_API_URL + _next
-
-            items: dict = response_json["items"]
+        for page in iter_pages(url):
+            items: dict = page["items"]
             slugs: list[str] = [item["slug"] for item in items]
             slug_result_list += slugs
 
@@ -125,7 +134,11 @@ def get_all_chart_slugs(platform: str, country_code: str) -> list[str] | None:
         return None
 
 
-def run_charts_scrape(pgc_tuples) -> tuple[str, pd.DataFrame, str]:
+def scrape_all_charts(pgc_tuples) -> pd.DataFrame:
+    """
+    Get the complete song info for new songs on the charts matching each platform, genre and country, before any
+    filtering. Must run on the main thread as scrape_charts uses a signal based timeout.
+    """
     logger.info("Scraping charts!".center(50, "-"))
     result_ls: list[pd.DataFrame] = [pd.DataFrame()]
 
@@ -154,15 +167,27 @@ def run_charts_scrape(pgc_tuples) -> tuple[str, pd.DataFrame, str]:
 
         count += 1
 
-    result_df: pd.DataFrame = pd.concat(result_ls, ignore_index=True)
-    result_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df=result_df)
+    return pd.concat(result_ls, ignore_index=True)
+
+
+def publish_chart_scrape(result_df: pd.DataFrame) -> tuple[str, pd.DataFrame, str]:
+    """
+    Filter the scraped chart songs and publish them to sheets and spotify.
+    """
+    result_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df=result_df, source="chart")
 
+    filtered_df = result_df
     result_df = drop_songs_that_appeared_in_past(result_df)
+    log_dropped_rows(filtered_df, result_df, "appeared_in_past", source="chart")
+    record_passed_songs(result_df, "chart")
     # result_df = add_past_appearances_to_df(result_df)
 
     # Reorder the columns
     result_df = result_df[chart_columns]
-    result_df.to_csv("chart_scrape.csv", index=False)
     logger.info(f"Finished scraping {len(result_df)} songs from charts".center(50, "-"))
 
-    return process_scrape_output(result_df, "chart")
\ No newline at end of file
+    return process_scrape_output(result_df, "chart")
+
+
+def run_charts_scrape(pgc_tuples) -> tuple[str, pd.DataFrame, str]:
+    return publish_chart_scrape(scrape_all_charts(pgc_tuples))
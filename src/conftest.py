@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# The modules read their folders and Spotify credentials from the environment when imported, tests point them at a
+# scratch folder unless a .env already sets them
+test_folder = tempfile.mkdtemp(prefix="soundcharts_tests_")
+os.environ.setdefault("OUTPUT_FOLDER", test_folder)
+os.environ.setdefault("LOGS_FOLDER", test_folder)
+os.environ.setdefault("SPOTIPY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIPY_CLIENT_SECRET", "test")
+os.environ.setdefault("SPOTIPY_REDIRECT_URI", "http://127.0.0.1/callback")
+
+# The input tests read the inputs worksheet, so they only run where the Google Sheets credentials are set up
+collect_ignore = [] if os.getenv("CREDENTIALS_FILENAME") else ["test_inputs.py"]
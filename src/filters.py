@@ -1,13 +1,17 @@
+import contextvars
 import os
 import string
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
 import pandas as pd
+import requests
 from dotenv import load_dotenv
 
 from src import input_lists
 from src.credentials_key_info import BASE_API_URL, credentials
+from src.history import history
+from src.language import get_title_languages
 from src.logging_config import logger
 from src.session_manager import session
 
@@ -154,7 +158,8 @@ def is_english(text: str):
 def log_dropped_rows(pre_df: pd.DataFrame,
                      post_df: pd.DataFrame,
                      filter_name: str,
-                     uuid_column: str = 'song_uuid') -> set:
+                     uuid_column: str = 'song_uuid',
+                     source: str | None = None) -> set:
     """
     Logs each dropped UUID with its filter name.
 
@@ -163,14 +168,19 @@ def log_dropped_rows(pre_df: pd.DataFrame,
         post_df: DataFrame after filtering
         filter_name: Name of the filter being applied
         uuid_column: Name of the UUID column
+        source: Scrape the songs came from, records the filter as their verdict in the history warehouse
     """
     pre_uuids = set(pre_df[uuid_column])
     post_uuids = set(post_df[uuid_column])
 
     dropped_uuids = pre_uuids - post_uuids
 
+    if dropped_uuids:
+        logger.debug(f"{len(dropped_uuids)} songs dropped due to {filter_name} filter")
+        if source:
+            history.record_verdicts(dropped_uuids, source, filter_name)
     for uuid in dropped_uuids:
-        logger.debug(f"Song {uuid} dropped due to {filter_name} filter")
+        logger.debug(f"Song {uuid} dropped due to {filter_name} filter", extra={"per_song": True})
 
     # Append the rows that were droppped to min_streams_dropped.csv
     if filter_name == "min_streams_if_above_0_average":
@@ -182,9 +192,18 @@ def log_dropped_rows(pre_df: pd.DataFrame,
     return dropped_uuids
 
 
+def record_passed_songs(df: pd.DataFrame, source: str) -> None:
+    """
+    Record the songs left after the last filter of a scrape as passed in the history warehouse.
+    """
+    if not df.empty:
+        history.record_verdicts(df["song_uuid"], source, "passed")
+
+
 def fetch_tiktok_followers_threaded(df):
     """
-    Fetch TikTok followers using threading without batching.
+    Fetch TikTok followers using threading without batching. Artists whose followers could not be fetched, e.g. while
+    the endpoint's circuit is open, get NaN.
     """
     unique_artists = df['main_artist_uuid'].unique()
     results = {}
@@ -192,7 +211,7 @@ def fetch_tiktok_followers_threaded(df):
     with ThreadPoolExecutor(max_workers=10) as executor:
         # Create future tasks for each unique artist
         future_to_artist = {
-            executor.submit(get_artist_audience, artist_id, "tiktok"): artist_id
+            executor.submit(contextvars.copy_context().run, get_artist_audience, artist_id, "tiktok"): artist_id
             for artist_id in unique_artists
         }
 
@@ -203,24 +222,25 @@ def fetch_tiktok_followers_threaded(df):
                 followers = future.result()
                 results[artist_id] = followers
             except Exception as e:
-                print(f"Error fetching followers for {artist_id}: {e}")
-                results[artist_id] = None
+                # Unknown rather than 0, the songs of the artist are kept by the TikTok filter either way
+                logger.warning(f"Error fetching TikTok followers for artist {artist_id}, keeping their songs: {e}")
+                results[artist_id] = np.nan
 
     # Map results back to dataframe
     return df['main_artist_uuid'].map(results)
 
 
-def apply_follower_stream_listeners_filters_and_drop_duplicates(df):
+def apply_follower_stream_listeners_filters_and_drop_duplicates(df, source: str | None = None):
     try:
         # Replace all NaN values with 0
         df = df.fillna(0)
 
         stream_filtered_df = df[(df["total_streams"] <= input_lists.max_streams)]
-        log_dropped_rows(df, stream_filtered_df, "max_streams")
+        log_dropped_rows(df, stream_filtered_df, "max_streams", source=source)
 
         follower_filtered_df = stream_filtered_df[
             (stream_filtered_df["main_artist_spotify_followers"] <= input_lists.max_spotify_followers)]
-        log_dropped_rows(stream_filtered_df, follower_filtered_df, "max_spotify_followers")
+        log_dropped_rows(stream_filtered_df, follower_filtered_df, "max_spotify_followers", source=source)
 
         # For rows with less than 100k monthly listeners, remove rows with less than input_lists.min followers
         minimum_spotify_followers_if_100k_monthly_listeners_filtered_df = follower_filtered_df[
@@ -235,7 +255,7 @@ def apply_follower_stream_listeners_filters_and_drop_duplicates(df):
             )
             ]
         log_dropped_rows(follower_filtered_df, minimum_spotify_followers_if_100k_monthly_listeners_filtered_df,
-                         "minimum_spotify_followers_if_100k_monthly_listeners")
+                         "minimum_spotify_followers_if_100k_monthly_listeners", source=source)
 
         min_stream_filter_df = minimum_spotify_followers_if_100k_monthly_listeners_filtered_df[
             # Keep rows where either:
@@ -244,25 +264,28 @@ def apply_follower_stream_listeners_filters_and_drop_duplicates(df):
                  "day_1-3_average"] >= input_lists.min_average_streams_if_above_0)
             ]
         log_dropped_rows(minimum_spotify_followers_if_100k_monthly_listeners_filtered_df, min_stream_filter_df,
-                         "min_streams_if_above_0_average")
+                         "min_streams_if_above_0_average", source=source)
 
         # For songs that made it this far get the artist tiktok followers
         min_stream_filter_df["main_artist_tiktok_followers"] = fetch_tiktok_followers_threaded(min_stream_filter_df)
 
-        # Filter artists with over input_lists.max_tiktok_followers if above 0
+        # Filter artists with over input_lists.max_tiktok_followers if above 0, keeping artists whose followers could
+        # not be fetched
         tiktok_filtered_df = min_stream_filter_df[
+            min_stream_filter_df["main_artist_tiktok_followers"].isna() |
             (min_stream_filter_df["main_artist_tiktok_followers"] == 0) |
             (min_stream_filter_df["main_artist_tiktok_followers"] <= input_lists.max_tiktok_followers)]
-        log_dropped_rows(min_stream_filter_df, tiktok_filtered_df, "max_tiktok_followers")
+        log_dropped_rows(min_stream_filter_df, tiktok_filtered_df, "max_tiktok_followers", source=source)
 
         # Dropping duplicates
         df = tiktok_filtered_df.drop_duplicates(subset="url")
         # Sort by today_streams in descending order
         df = df.sort_values(by="today_streams", ascending=False)
 
-        # Log all songs that passed all filters
+        # Log all songs that passed all filters, they are recorded as passed once the scrape's own filters have run
+        logger.debug(f"{len(df)} songs passed all filters")
         for uuid in df['song_uuid']:
-            logger.debug(f"song {uuid} passed all filters")
+            logger.debug(f"song {uuid} passed all filters", extra={"per_song": True})
 
         return df
 
@@ -281,15 +304,21 @@ def get_artist_audience(artist_uuid: str, platform: str) -> int:
         items = response.json()["items"]
         most_recent_day = items[-1]
         follower_count: int = most_recent_day.get("followerCount")
-        logger.debug(f"Artist {artist_uuid} has {follower_count} {platform} followers")
+        logger.debug(f"Artist {artist_uuid} has {follower_count} {platform} followers", extra={"per_song": True})
         return follower_count
+    except requests.RequestException:
+        raise
     except Exception as e:
         logger.debug(f"Failed getting artist audience {e}")
         return 0
 
 
 def non_instrumental_non_english(song_metadata, instrumentalness):
-    if not is_english(song_metadata.name):
+    """
+    Titles that are not plain ASCII are classified by the detected language, so accented English titles pass and
+    songs in other languages only pass when they are instrumental.
+    """
+    if not is_english(song_metadata.name) and not get_title_languages().is_english(song_metadata.name):
         # If the song is not in English, we check if it is instrumental
         if isinstance(instrumentalness, float):
             # If the song has less than 50% instrumentalness, we consider it non-instrumental
@@ -0,0 +1,220 @@
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from src.logging_config import logger
+
+load_dotenv()
+
+# "record" saves every response of the mounted sessions, "replay" serves them back without touching the network
+FIXTURE_MODE = os.getenv("HTTP_FIXTURE_MODE")
+FIXTURE_PATH = os.getenv("HTTP_FIXTURE_PATH", "fixtures/http_fixtures.jsonl.gz")
+# Seconds to wait before each replayed response, leave unset to replay the recorded latency
+FIXTURE_LATENCY = os.getenv("HTTP_FIXTURE_LATENCY")
+
+# Recorded responses written between flushes of the archive, a crashed recording keeps everything up to the last flush
+FIXTURE_FLUSH_RECORDS = 100
+
+# Query parameters counted back from the current date, e.g. the audience history windows, are keyed as a day offset
+# from the day of the recording or replay, so a recording still replays on later days
+RELATIVE_DATE_PARAMS = {"startDate", "endDate"}
+
+# Headers describing the encoding of the original body, which no longer apply to the stored decoded content
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def normalise_relative_dates(url: str, today: date) -> str:
+    """
+    Replace the dates of the RELATIVE_DATE_PARAMS with their offset from today, e.g. startDate=today-30. Dates in the
+    path come from earlier responses rather than the clock, so they are kept as they are.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    normalised = []
+    for name, value in query:
+        if name in RELATIVE_DATE_PARAMS:
+            try:
+                offset = (date.fromisoformat(value[:10]) - today).days
+                value = f"today{offset:+d}{value[10:]}"
+            except ValueError:
+                pass
+        normalised.append((name, value))
+
+    # Other urls are left untouched so their keys do not depend on how the query is encoded
+    if normalised == query:
+        return url
+    return urlunsplit(parts._replace(query=urlencode(normalised)))
+
+
+def get_fixture_key(request: requests.PreparedRequest, today: date | None = None) -> str:
+    """
+    Requests are matched on method, url and a hash of the body. Headers are left out so credentials are never stored,
+    and dates counted back from the current date are keyed relative to today.
+    """
+    url = normalise_relative_dates(request.url, today or date.today())
+    key = f"{request.method} {url}"
+    if request.body:
+        body = request.body if isinstance(request.body, bytes) else str(request.body).encode("utf-8")
+        key += f" {hashlib.sha1(body).hexdigest()}"
+    return key
+
+
+class FixtureStore:
+    """
+    Gzipped JSON lines archive of recorded responses.
+
+    Responses are written to a single gzip stream that stays open for the whole recording and is flushed every
+    FIXTURE_FLUSH_RECORDS responses, so a crashed recording is still usable up to its last flush. When the same
+    request was recorded several times the responses are replayed in the recorded order, repeating the last one.
+    """
+
+    def __init__(self, path: str, mode: str, latency: float | None = None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown fixture mode {mode}, expected record or replay")
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.fixtures: dict[str, list[dict]] = defaultdict(list)
+        self.replay_positions: dict[str, int] = defaultdict(int)
+        self.writer: gzip.GzipFile | None = None
+        self.unflushed = 0
+
+        if mode == "replay":
+            self.load()
+        else:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self) -> None:
+        with gzip.open(self.path, mode="rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    fixture = json.loads(line)
+                    self.fixtures[fixture["key"]].append(fixture)
+            except (EOFError, json.JSONDecodeError):
+                # A recording that crashed ends after its last flush, possibly within a line
+                logger.warning(f"Fixture archive {self.path} is truncated, replaying the responses before the cut")
+
+        logger.info(f"Loaded {sum(len(f) for f in self.fixtures.values())} recorded responses from {self.path}")
+
+    def record(self, key: str, response: requests.Response) -> None:
+        content = response.content
+        try:
+            body, body_encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, body_encoding = base64.b64encode(content).decode("ascii"), "base64"
+
+        fixture = {
+            "key": key,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: value for name, value in response.headers.items()
+                        if name.lower() not in DROPPED_HEADERS},
+            "body": body,
+            "body_encoding": body_encoding,
+            "elapsed": response.elapsed.total_seconds(),
+        }
+
+        line = json.dumps(fixture) + "\n"
+        with self.lock:
+            if self.writer is None:
+                self.writer = gzip.open(self.path, mode="ab")
+            self.writer.write(line.encode("utf-8"))
+            self.unflushed += 1
+            if self.unflushed >= FIXTURE_FLUSH_RECORDS:
+                self.writer.flush()
+                self.unflushed = 0
+
+    def close(self) -> None:
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+
+    def replay(self, key: str, request: requests.PreparedRequest) -> requests.Response:
+        with self.lock:
+            fixtures = self.fixtures.get(key)
+            if not fixtures:
+                raise requests.ConnectionError(f"No recorded response for {key}", request=request)
+
+            position = self.replay_positions[key]
+            self.replay_positions[key] += 1
+            fixture = fixtures[min(position, len(fixtures) - 1)]
+
+        elapsed = self.latency if self.latency is not None else fixture["elapsed"]
+        time.sleep(elapsed)
+
+        response = requests.Response()
+        response.status_code = fixture["status"]
+        response.reason = fixture["reason"]
+        response.headers = CaseInsensitiveDict(fixture["headers"])
+        if fixture["body_encoding"] == "base64":
+            response._content = base64.b64decode(fixture["body"])
+        else:
+            response._content = fixture["body"].encode("utf-8")
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=elapsed)
+        return response
+
+
+class FixtureAdapter(BaseAdapter):
+    """
+    Transport adapter that records the responses of the inner adapter, or replays them from the store.
+    """
+
+    def __init__(self, store: FixtureStore, inner: BaseAdapter | None = None):
+        super().__init__()
+        self.store = store
+        self.inner = inner or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        key = get_fixture_key(request)
+        if self.store.mode == "replay":
+            return self.store.replay(key, request)
+
+        response = self.inner.send(request, **kwargs)
+        self.store.record(key, response)
+        return response
+
+    def close(self):
+        self.store.close()
+        self.inner.close()
+
+
+fixture_store = FixtureStore(
+    FIXTURE_PATH, FIXTURE_MODE, float(FIXTURE_LATENCY) if FIXTURE_LATENCY else None
+) if FIXTURE_MODE else None
+if fixture_store is not None:
+    atexit.register(fixture_store.close)
+
+
+def mount_fixture_adapter(session: requests.Session) -> None:
+    """
+    Record or replay every request of the session when HTTP_FIXTURE_MODE is set, recording through the adapter
+    already mounted on the session.
+    """
+    if fixture_store is None:
+        return
+
+    adapter = FixtureAdapter(fixture_store, inner=session.get_adapter("https://"))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    logger.info(f"Mounted {fixture_store.mode} fixture adapter on {type(session).__name__}")
@@ -1,17 +1,20 @@
 import datetime
 
 import pandas as pd
-import requests
 
 from src.credentials_key_info import BASE_API_URL, credentials
-from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates
-from src.input_lists import max_change_in_total_streams_over_period, \
-    min_change_in_total_streams_over_period, period, sort_by, ranking_max_total_streams, \
-    ranking_min_total_streams, ranking_pages_to_collect
+from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates, log_dropped_rows, \
+    record_passed_songs
+from src.history import history
+from src import input_lists
+from src.language import get_title_languages
 from src.logging_config import logger
 from src.output import process_scrape_output
+from src.run_journal import get_run_journal
 from src.session_manager import session
-from src.song_info import get_all_song_info
+from src.pagination import iter_pages
+from src.song_info import get_song_info_rows
+from src.song_records import SongRowBuffer
 
 columns = [
     # Identifier columns
@@ -61,9 +64,9 @@ columns = [
 ]
 
 
-def extract_songs(response: requests.Response):
+def extract_songs(items: list[dict]):
     songs = []
-    for song in response.json().get("items"):
+    for song in items:
         songs.append({
             # "song_name": song.get("song").get("name"),
             "song_uuid": song.get("song").get("uuid"),
@@ -103,22 +106,15 @@ def get_song_ranking(
 
     if country_code:
         url += f"&countryCode={country_code}"
-    next_page = url
 
+    # The requested pages are fetched concurrently once the first page gives the total
     songs = []
-    while pages_to_collect > 0 and next_page:
-        response = session.get(next_page, headers=credentials)
-        logger.debug(response.json())
-        songs += extract_songs(response)
-
-        pages_to_collect -= 1
-        _next: str = response.json().get("page").get("next")
-        if _next:
-            _next = _next.removeprefix("/api")
-            next_page = BASE_API_URL + _next
-        else:
-            next_page = None
-        logger.debug(f"{pages_to_collect} pages left to collect".center(50, "*"))
+    if pages_to_collect > 0:
+        for page in iter_pages(url, max_pages=pages_to_collect):
+            items = page.get("items") or []
+            get_title_languages().prime(song["song"]["name"] for song in items)
+            songs += extract_songs(items)
+        logger.debug(f"Collected {len(songs)} songs from the ranking".center(50, "*"))
 
     df = pd.DataFrame(songs)
 
@@ -135,23 +131,37 @@ def enrich_dataframe(original_df):
     # Create a copy to avoid modifying the original DataFrame
     enriched_df = original_df.copy()
 
-    # Create a list to store song information DataFrames
-    song_info_dfs = []
+    # Buffer the song information rows to build a single DataFrame
+    song_rows = SongRowBuffer()
 
     # Iterate through unique song UUIDs
     total = len(original_df['song_uuid'].unique())
     count = 0
     for song_uuid in original_df['song_uuid'].unique():
-        # Get song info for each unique song UUID
-        song_info = get_all_song_info(song_uuid)
-        if not song_info.empty:
-            song_info_dfs.append(song_info)
+        # Get song info for each unique song UUID, reusing it if it was already finished earlier in today's run
+        rows = get_run_journal().get("general_ranking", song_uuid)
+        if rows is None:
+            try:
+                rows = get_song_info_rows(song_uuid, source="general_ranking")
+            except Exception as e:
+                # Left out of the journal so a restarted run tries the song again
+                logger.warning(f"Failed getting song info for {song_uuid} in the general ranking: {e}")
+                history.record_candidate({"song_uuid": song_uuid}, "general_ranking", "error")
+                continue
+            get_run_journal().record("general_ranking", song_uuid, rows)
+        else:
+            # Candidates not yet flushed to the history when the earlier run crashed are recorded again
+            history.record_candidates(rows, "general_ranking", "enriched")
+
+        song_rows.extend(rows)
 
         count += 1
         logger.debug(f"Got song info for {count}/{total} songs")
 
-    # Concatenate all song info DataFrames
-    song_info_combined = pd.concat(song_info_dfs, ignore_index=True)
+    if not song_rows:
+        return pd.DataFrame()
+
+    song_info_combined = song_rows.to_df()
 
     # Merge the original DataFrame with the song info
     enriched_df = pd.merge(enriched_df, song_info_combined, on='song_uuid', how='right', validate="one_to_one")
@@ -164,34 +174,56 @@ def updated_within_24_hours(updated_at: datetime.datetime) -> bool:
     return right_now - updated_at < datetime.timedelta(days=1)
 
 
-def run_general_ranking_scrape(on: bool = False) -> pd.DataFrame | None:
+def scrape_general_ranking(on: bool = False) -> tuple[pd.DataFrame, datetime.datetime] | None:
+    """
+    Get the enriched top songs for the period if the ranking was updated in the last day, before any filtering.
+    """
     logger.info("Running general ranking scrape".center(50, "-"))
 
     updated_at = get_updated_at_for_song_ranking()
 
-    if updated_within_24_hours(updated_at) and on:
-        # Do the full scrape
-        # Get the top songs for the week
-        song_ranking = get_song_ranking(
-            audience_max_change=max_change_in_total_streams_over_period,
-            audience_min_change=min_change_in_total_streams_over_period,
-            period=period,
-            platform="spotify",
-            metric="streams",
-            sort_by=sort_by,
-            pages_to_collect=ranking_pages_to_collect,
-            max_total_audience=ranking_max_total_streams,
-            min_total_audience=ranking_min_total_streams,
-        )
-
-        enriched_song_ranking = enrich_dataframe(song_ranking)
-
-        # Filter songs without 100% increase in week_to_week_percentage_increase
-        enriched_song_ranking = enriched_song_ranking[enriched_song_ranking["week_to_week_percentage_increase"] >= 100]
-
-        result_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df=enriched_song_ranking)
-        result_df = result_df[columns]
-        return process_scrape_output(result_df, "general", str(updated_at.date()))
-
-    else:
+    if not (updated_within_24_hours(updated_at) and on):
+        return None
+
+    # Do the full scrape
+    # Get the top songs for the week
+    song_ranking = get_song_ranking(
+        audience_max_change=input_lists.max_change_in_total_streams_over_period,
+        audience_min_change=input_lists.min_change_in_total_streams_over_period,
+        period=input_lists.period,
+        platform="spotify",
+        metric="streams",
+        sort_by=input_lists.sort_by,
+        pages_to_collect=input_lists.ranking_pages_to_collect,
+        max_total_audience=input_lists.ranking_max_total_streams,
+        min_total_audience=input_lists.ranking_min_total_streams,
+    )
+
+    enriched_song_ranking = enrich_dataframe(song_ranking)
+    return enriched_song_ranking, updated_at
+
+
+def publish_general_ranking_scrape(scrape: tuple[pd.DataFrame, datetime.datetime] | None):
+    """
+    Filter the enriched top songs and publish them to sheets and spotify.
+    """
+    if scrape is None:
         return None, None, None
+
+    enriched_song_ranking, updated_at = scrape
+
+    # Filter songs without 100% increase in week_to_week_percentage_increase
+    week_to_week_filtered_df = enriched_song_ranking[
+        enriched_song_ranking["week_to_week_percentage_increase"] >= 100]
+    log_dropped_rows(enriched_song_ranking, week_to_week_filtered_df, "week_to_week_percentage_increase",
+                     source="general_ranking")
+
+    result_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df=week_to_week_filtered_df,
+                                                                           source="general_ranking")
+    record_passed_songs(result_df, "general_ranking")
+    result_df = result_df[columns]
+    return process_scrape_output(result_df, "general", str(updated_at.date()))
+
+
+def run_general_ranking_scrape(on: bool = False) -> pd.DataFrame | None:
+    return publish_general_ranking_scrape(scrape_general_ranking(on))
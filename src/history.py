@@ -0,0 +1,186 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.logging_config import logger
+
+load_dotenv()
+
+HISTORY_FLUSH_ROWS = 500
+
+# Kept as columns for querying, the full row is stored as JSON
+CANDIDATE_COLUMNS = [
+    "song_name",
+    "main_artist",
+    "main_artist_uuid",
+    "labels",
+    "main_artist_spotify_followers",
+    "main_artist_spotify_monthly_listeners",
+    "today_streams",
+    "day_1-3_average",
+    "total_streams",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS candidates (
+    scrape_date TEXT NOT NULL,
+    source TEXT NOT NULL,
+    song_uuid TEXT NOT NULL,
+    song_name TEXT,
+    main_artist TEXT,
+    main_artist_uuid TEXT,
+    labels TEXT,
+    main_artist_spotify_followers REAL,
+    main_artist_spotify_monthly_listeners REAL,
+    today_streams REAL,
+    day_1_3_average REAL,
+    total_streams REAL,
+    verdict TEXT NOT NULL,
+    row_json TEXT,
+    PRIMARY KEY (scrape_date, source, song_uuid)
+);
+CREATE INDEX IF NOT EXISTS candidates_song_uuid ON candidates (song_uuid);
+CREATE INDEX IF NOT EXISTS candidates_main_artist_uuid ON candidates (main_artist_uuid, scrape_date);
+CREATE INDEX IF NOT EXISTS candidates_main_artist ON candidates (main_artist);
+CREATE INDEX IF NOT EXISTS candidates_scrape_date ON candidates (scrape_date, verdict);
+"""
+
+UPSERT_CANDIDATE = """
+INSERT INTO candidates (scrape_date, source, song_uuid, song_name, main_artist, main_artist_uuid, labels,
+                        main_artist_spotify_followers, main_artist_spotify_monthly_listeners, today_streams,
+                        day_1_3_average, total_streams, verdict, row_json)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (scrape_date, source, song_uuid) DO UPDATE SET
+    song_name = excluded.song_name,
+    main_artist = excluded.main_artist,
+    main_artist_uuid = excluded.main_artist_uuid,
+    labels = excluded.labels,
+    main_artist_spotify_followers = excluded.main_artist_spotify_followers,
+    main_artist_spotify_monthly_listeners = excluded.main_artist_spotify_monthly_listeners,
+    today_streams = excluded.today_streams,
+    day_1_3_average = excluded.day_1_3_average,
+    total_streams = excluded.total_streams,
+    verdict = excluded.verdict,
+    row_json = excluded.row_json
+"""
+
+
+def to_sql_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+class HistoryWarehouse:
+    """
+    SQLite store of every enriched candidate with the source that found it, the scrape date and the filter verdict,
+    including the songs that were filtered out.
+
+    Candidates are buffered and written in batches, the connection is opened on first use.
+    """
+
+    def __init__(self, path: str, flush_rows: int = HISTORY_FLUSH_ROWS):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.lock = threading.Lock()
+        self.pending: list[tuple] = []
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def record_candidate(self, row: dict, source: str, verdict: str, scrape_date: str | None = None) -> None:
+        scrape_date = scrape_date or str(datetime.now().date())
+        values = (scrape_date, source, row["song_uuid"],
+                  *[to_sql_value(row.get(column)) for column in CANDIDATE_COLUMNS],
+                  verdict, json.dumps(row, default=to_sql_value))
+
+        with self.lock:
+            self.pending.append(values)
+            if len(self.pending) < self.flush_rows:
+                return
+            self._flush()
+
+    def record_candidates(self, rows: list[dict], source: str, verdict: str, scrape_date: str | None = None) -> None:
+        for row in rows:
+            self.record_candidate(row, source, verdict, scrape_date)
+
+    def record_verdicts(self, song_uuids, source: str, verdict: str, scrape_date: str | None = None) -> None:
+        """
+        Set the verdict of candidates already recorded for the day, e.g. when they are dropped by a filter.
+        """
+        scrape_date = scrape_date or str(datetime.now().date())
+        with self.lock:
+            self._flush()
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE candidates SET verdict = ? WHERE scrape_date = ? AND source = ? AND song_uuid = ?",
+                    [(verdict, scrape_date, source, song_uuid) for song_uuid in song_uuids])
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        try:
+            with self.connection:
+                self.connection.executemany(UPSERT_CANDIDATE, self.pending)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to write {len(self.pending)} candidates to history {self.path}: {e}")
+        self.pending = []
+
+    def query(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        self.flush()
+        with self.lock:
+            return pd.read_sql_query(sql, self.connection, params=params)
+
+    def get_song_history(self, song_uuid: str) -> pd.DataFrame:
+        return self.query("SELECT scrape_date, source, verdict, today_streams, total_streams FROM candidates "
+                          "WHERE song_uuid = ? ORDER BY scrape_date", (song_uuid,))
+
+    def get_artist_appearances(self, artist_uuid: str, since: str | None = None) -> pd.DataFrame:
+        """
+        How often the artist has surfaced, per day and source.
+        """
+        return self.query("SELECT scrape_date, source, COUNT(*) AS songs, "
+                          "SUM(verdict = 'passed') AS songs_passed FROM candidates "
+                          "WHERE main_artist_uuid = ? AND scrape_date >= ? "
+                          "GROUP BY scrape_date, source ORDER BY scrape_date", (artist_uuid, since or ""))
+
+    def count_artist_appearances(self, artist_uuid: str, since: str | None = None) -> int:
+        appearances = self.get_artist_appearances(artist_uuid, since)
+        return int(appearances["songs"].sum()) if not appearances.empty else 0
+
+    def get_verdict_counts(self, scrape_date: str | None = None) -> dict[str, int]:
+        scrape_date = scrape_date or str(datetime.now().date())
+        counts = self.query("SELECT verdict, COUNT(*) AS songs FROM candidates WHERE scrape_date = ? "
+                            "GROUP BY verdict", (scrape_date,))
+        return dict(zip(counts["verdict"], counts["songs"].astype(int)))
+
+
+def get_history_warehouse() -> HistoryWarehouse:
+    OUTPUT_FOLDER = os.getenv("OUTPUT_FOLDER")
+    warehouse = HistoryWarehouse(f"{OUTPUT_FOLDER}/history.sqlite")
+    atexit.register(warehouse.flush)
+    return warehouse
+
+
+history = get_history_warehouse()
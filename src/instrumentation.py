@@ -0,0 +1,202 @@
+import contextvars
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from src.logging_config import logger
+
+# Upper bounds of the latency histogram buckets, anything slower goes in a final overflow bucket
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}[^/]*")
+CHART_SLUG_PATTERN = re.compile(r"(/chart/song/)(?!by-platform/)[^/]+")
+
+
+def get_endpoint_name(method: str, url: str) -> str:
+    """
+    Group a request url under its endpoint, e.g. GET /v2.25/song/{uuid}, by dropping the query and replacing the
+    uuids, dates and chart slugs in the path.
+    """
+    path = urlsplit(url).path
+    path = UUID_PATTERN.sub("{uuid}", path)
+    path = DATE_PATTERN.sub("{date}", path)
+    path = CHART_SLUG_PATTERN.sub(r"\1{slug}", path)
+    return f"{method.upper()} {path}"
+
+
+@dataclass
+class EndpointStats:
+    count: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    bytes: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    histogram: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+    def add(self, seconds: float, from_cache: bool, response_bytes: int, error: bool) -> None:
+        self.count += 1
+        self.cache_hits += int(from_cache)
+        self.errors += int(error)
+        self.bytes += response_bytes
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+        milliseconds = seconds * 1000
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if milliseconds <= bound),
+                      len(LATENCY_BUCKETS_MS))
+        self.histogram[bucket] += 1
+
+    def to_dict(self) -> dict:
+        bucket_names = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "cache_hits": self.cache_hits,
+            "cache_hit_ratio": round(self.cache_hits / self.count, 3) if self.count else 0,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "mean_ms": round(self.total_seconds / self.count * 1000, 1) if self.count else 0,
+            "max_ms": round(self.max_seconds * 1000, 1),
+            "latency_histogram": dict(zip(bucket_names, self.histogram)),
+        }
+
+
+@dataclass
+class StageStats:
+    requests: int = 0
+    cache_hits: int = 0
+    quota_consumed: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "quota_consumed": self.quota_consumed,
+            "seconds": round(self.seconds, 1),
+        }
+
+
+# The stage the current thread is working for, thread pools started inside a stage must run their tasks in a copy
+# of the submitting context for their requests to be accounted to the stage
+current_stage: contextvars.ContextVar[str | None] = contextvars.ContextVar("current_stage", default=None)
+
+
+class Instrumentation:
+    """
+    Thread safe per endpoint counts, cache hits, latency histograms and bytes for the run, along with the Soundcharts
+    requests, cache hits, quota and wall time used by each stage.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: dict[str, EndpointStats] = {}
+        self.stages: dict[str, StageStats] = {}
+        self.started_at = datetime.now()
+
+    def record(self, endpoint: str, seconds: float, from_cache: bool = False, response_bytes: int = 0,
+               error: bool = False) -> None:
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.add(seconds, from_cache, response_bytes, error)
+
+    def record_soundcharts_response(self, from_cache: bool, quota_consumed: int = 0) -> None:
+        """
+        Account a Soundcharts response and the quota it consumed to the current stage.
+        """
+        with self.lock:
+            stage_stats = self.stages.setdefault(current_stage.get() or "other", StageStats())
+            stage_stats.requests += 1
+            stage_stats.cache_hits += int(from_cache)
+            stage_stats.quota_consumed += quota_consumed
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Account the requests made and the wall time spent inside the block to the stage.
+        """
+        token = current_stage.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            current_stage.reset(token)
+            with self.lock:
+                self.stages.setdefault(name, StageStats()).seconds += seconds
+
+    def stage_summary(self) -> dict[str, dict]:
+        with self.lock:
+            return {name: stats.to_dict() for name, stats in self.stages.items()}
+
+    @contextmanager
+    def timed(self, endpoint: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(endpoint, time.perf_counter() - start, error=True)
+            raise
+        self.record(endpoint, time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        stages = self.stage_summary()
+        with self.lock:
+            endpoints = {name: stats.to_dict() for name, stats in sorted(self.endpoints.items())}
+            requests_made = sum(stats.count for stats in self.endpoints.values())
+            cache_hits = sum(stats.cache_hits for stats in self.endpoints.values())
+
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "requests": requests_made,
+            "cache_hits": cache_hits,
+            "cache_hit_ratio": round(cache_hits / requests_made, 3) if requests_made else 0,
+            "stages": stages,
+            "endpoints": endpoints,
+        }
+
+    def write_summary(self, path: str, extra: dict | None = None) -> None:
+        summary = self.summary()
+        if extra:
+            summary.update(extra)
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Wrote run summary with {summary['requests']} requests to {path}")
+
+    def append_stage_metrics(self, path: str) -> None:
+        """
+        Append the stage metrics of the run as a line of JSON to the metrics log.
+        """
+        line = json.dumps({"date": str(self.started_at.date()), "stages": self.stage_summary()})
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+instrumentation = Instrumentation()
+
+
+def instrumented(service: str):
+    """
+    Decorator recording every call of a Sheets or Spotify wrapper as the endpoint {service}.{function name}.
+    """
+
+    def decorator(func):
+        endpoint = f"{service}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with instrumentation.timed(endpoint):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,115 @@
+import atexit
+import json
+import os
+import threading
+from typing import Iterable
+
+from dotenv import load_dotenv
+
+from src.logging_config import logger
+
+load_dotenv()
+
+ENGLISH = "ENGLISH"
+
+
+class TitleLanguageClassifier:
+    """
+    Language of song titles, detected with lingua in batches and cached on disk by title.
+
+    ASCII titles are taken as English without running the detector, so only titles with other characters are
+    detected. The detector is built on first use as loading its models is slow.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.detector = None
+        self.languages: dict[str, str | None] = {}
+        self.dirty = False
+
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    self.languages = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Failed to load title language cache {cache_path}: {e}")
+
+    def get_detector(self):
+        with self.lock:
+            if self.detector is None:
+                from lingua import LanguageDetectorBuilder
+                self.detector = LanguageDetectorBuilder.from_all_languages().build()
+            return self.detector
+
+    def prime(self, titles: Iterable[str]) -> None:
+        """
+        Detect the language of all the uncached titles in one batch, call this with the titles of a discovery page
+        so the per song filters only hit the cache.
+        """
+        with self.lock:
+            uncached = list({title for title in titles
+                             if isinstance(title, str) and not title.isascii() and title not in self.languages})
+        if not uncached:
+            return
+
+        detected = self.get_detector().detect_languages_in_parallel_of(uncached)
+        with self.lock:
+            for title, language in zip(uncached, detected):
+                self.languages[title] = language.name if language else None
+            self.dirty = True
+        logger.debug(f"Detected the language of {len(uncached)} titles")
+
+    def get_language(self, title: str) -> str | None:
+        if title.isascii():
+            return ENGLISH
+
+        with self.lock:
+            if title in self.languages:
+                return self.languages[title]
+
+        self.prime([title])
+        with self.lock:
+            return self.languages.get(title)
+
+    def is_english(self, title) -> bool:
+        if not isinstance(title, str):
+            return False
+        return self.get_language(title) == ENGLISH
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            languages = dict(self.languages)
+            self.dirty = False
+
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(languages, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to save title language cache {self.cache_path}: {e}")
+
+
+def get_title_language_classifier() -> TitleLanguageClassifier:
+    OUTPUT_FOLDER = os.getenv("OUTPUT_FOLDER")
+    classifier = TitleLanguageClassifier(f"{OUTPUT_FOLDER}/title_languages.json")
+    atexit.register(classifier.save)
+    return classifier
+
+
+_title_languages: TitleLanguageClassifier | None = None
+_title_languages_lock = threading.Lock()
+
+
+def get_title_languages() -> TitleLanguageClassifier:
+    """
+    Load the title language cache on first use, so importing the filters does not need OUTPUT_FOLDER.
+    """
+    global _title_languages
+    with _title_languages_lock:
+        if _title_languages is None:
+            _title_languages = get_title_language_classifier()
+    return _title_languages
@@ -1,8 +1,68 @@
+import atexit
+import gzip
 import os
 import logging
+import queue
+import shutil
 import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
+# Size based rotation, rotated files are gzip compressed
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+
+# Records logged with extra={"per_song": True} are limited to this many per call site per interval
+PER_SONG_LOG_LIMIT = int(os.getenv("PER_SONG_LOG_LIMIT", 20))
+PER_SONG_LOG_INTERVAL = float(os.getenv("PER_SONG_LOG_INTERVAL", 10))
+
+
+def gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+class PerSongRateLimitFilter(logging.Filter):
+    """
+    Let through at most limit per song records per call site in each interval, when an interval with dropped
+    records ends the next record that gets through notes how many were suppressed.
+    """
+
+    def __init__(self, limit: int = PER_SONG_LOG_LIMIT, interval: float = PER_SONG_LOG_INTERVAL):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "per_song", False):
+            return True
+
+        call_site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window_start, count, suppressed = self._windows.get(call_site, (now, 0, 0))
+            if now - window_start >= self.interval:
+                window_start, count = now, 0
+
+            if count >= self.limit:
+                self._windows[call_site] = (window_start, count, suppressed + 1)
+                return False
+
+            self._windows[call_site] = (window_start, count + 1, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
 
 def setup_logger():
     # Determine the project root and ensure logs directory exists
@@ -27,11 +87,17 @@ def setup_logger():
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    # Handlers
-    debug_handler = logging.FileHandler(debug_log_file, encoding='utf-8')
-    info_handler = logging.FileHandler(info_log_file, encoding='utf-8')
+    # Handlers, these run on the listener thread so worker threads only pay for putting the record on the queue
+    debug_handler = RotatingFileHandler(debug_log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                        encoding='utf-8')
+    info_handler = RotatingFileHandler(info_log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                       encoding='utf-8')
     console_handler = logging.StreamHandler(sys.stdout)
 
+    for handler in (debug_handler, info_handler):
+        handler.namer = gzip_namer
+        handler.rotator = gzip_rotator
+
     # Set logging levels for handlers
     debug_handler.setLevel(logging.DEBUG)
     info_handler.setLevel(logging.INFO)
@@ -43,10 +109,17 @@ def setup_logger():
     info_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
+    # Sampling happens before the record is queued so suppressed records cost nothing further
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(PerSongRateLimitFilter())
+
+    listener = QueueListener(log_queue, debug_handler, info_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     # Add handlers to logger
-    logger.addHandler(debug_handler)
-    logger.addHandler(info_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(queue_handler)
 
     # Set logger level
     logger.setLevel(logging.DEBUG)
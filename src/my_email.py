@@ -1,5 +1,7 @@
 import os
 import smtplib
+import threading
+import time
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
@@ -9,15 +11,17 @@ from src.credentials_key_info import SENDER_EMAIL, SMTP_KEY
 from src.logging_config import logger
 
 
-def send_email(recipient: str, subject: str, message: str, attachment_paths: list):
-    sender_email = SENDER_EMAIL
-    smtp_key = SMTP_KEY
-    recipient_email = recipient
+SMTP_HOST = "smtp-relay.brevo.com"
+SMTP_PORT = 587
+SMTP_ATTEMPTS = 3
+SMTP_RETRY_SECONDS = 10
+
 
+def build_email(recipient: str, subject: str, message: str, attachment_paths: list) -> MIMEMultipart:
     # Setup the email message
     msg = MIMEMultipart()
-    msg["From"] = sender_email
-    msg["To"] = recipient_email
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = recipient
     msg["Subject"] = subject
     msg.attach(MIMEText(message, "plain"))
 
@@ -36,22 +40,51 @@ def send_email(recipient: str, subject: str, message: str, attachment_paths: lis
         except Exception as e:
             logger.warning(f"Failed to attach file {attachment_path}: {e}")
 
-    # Connect to the SMTP server
-    try:
-        server = smtplib.SMTP("smtp-relay.brevo.com", 587)
-        server.starttls()
-        server.login(sender_email, smtp_key)
-    except Exception as e:
-        logger.debug(f"Failed to connect to SMTP server: {e}")
-        return False
-
-    # Send the email
-    try:
-        server.sendmail(sender_email, recipient_email, msg.as_string())
-        logger.info(f"Email notification sent successfully to: {recipient_email}")
-        return True
-    except Exception as e:
-        logger.debug(f"Failed to send email: {e}")
-        return False
-    finally:
-        server.quit()
+    return msg
+
+
+def send_emails(messages: list[MIMEMultipart]) -> bool:
+    """
+    Send the messages over a single SMTP connection. If the connection fails the messages not yet sent are retried
+    on a new connection.
+    """
+    unsent = list(messages)
+    for attempt in range(1, SMTP_ATTEMPTS + 1):
+        try:
+            server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+            try:
+                server.starttls()
+                server.login(SENDER_EMAIL, SMTP_KEY)
+                while unsent:
+                    msg = unsent[0]
+                    server.sendmail(SENDER_EMAIL, msg["To"], msg.as_string())
+                    logger.info(f"Email notification sent successfully to: {msg['To']}")
+                    unsent.pop(0)
+            finally:
+                try:
+                    server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+            return True
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning(f"Failed to send emails on attempt {attempt}/{SMTP_ATTEMPTS}, "
+                           f"{len(unsent)} left to send: {e}")
+            if attempt < SMTP_ATTEMPTS:
+                time.sleep(SMTP_RETRY_SECONDS * attempt)
+
+    logger.error(f"Gave up sending emails to: {', '.join(msg['To'] for msg in unsent)}")
+    return False
+
+
+def send_emails_in_background(messages: list[MIMEMultipart]) -> threading.Thread:
+    """
+    Send the messages on a separate thread so the caller can finish without waiting on SMTP. The thread is not a
+    daemon, so the process still waits for the emails before exiting.
+    """
+    thread = threading.Thread(target=send_emails, args=(messages,), name="email_dispatch", daemon=False)
+    thread.start()
+    return thread
+
+
+def send_email(recipient: str, subject: str, message: str, attachment_paths: list):
+    return send_emails([build_email(recipient, subject, message, attachment_paths)])
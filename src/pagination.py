@@ -0,0 +1,68 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from src.credentials_key_info import BASE_API_URL, credentials
+from src.session_manager import session
+
+PAGE_LIMIT = 100
+PAGINATION_MAX_WORKERS = 8
+
+
+def set_offset_and_limit(url: str, offset: int, limit: int) -> str:
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in ("offset", "limit")]
+    query += [("offset", str(offset)), ("limit", str(limit))]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def fetch_page(url: str) -> dict:
+    response = session.get(url, headers=credentials)
+    response.raise_for_status()
+    return response.json()
+
+
+def iter_pages(url: str, limit: int = PAGE_LIMIT, max_pages: int | None = None,
+               max_workers: int = PAGINATION_MAX_WORKERS) -> Iterator[dict]:
+    """
+    Yield the JSON of each page of an offset paginated endpoint, in order.
+
+    The total is read from the first page and the remaining offsets are fetched concurrently, so a ranking of ten
+    pages takes two round trips instead of ten. Endpoints that do not report a total are walked through their next
+    links instead.
+    """
+    first_page = fetch_page(set_offset_and_limit(url, 0, limit))
+    yield first_page
+
+    page_info = first_page.get("page") or {}
+    total = page_info.get("total")
+    pages_left = max_pages - 1 if max_pages is not None else None
+
+    if total is None:
+        yield from iter_next_pages(page_info.get("next"), pages_left)
+        return
+
+    offsets = list(range(limit, total, limit))
+    if pages_left is not None:
+        offsets = offsets[:pages_left]
+    if not offsets:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(offsets))) as executor:
+        # Fetched in a copy of the current context so the requests are accounted to the current stage
+        futures = [executor.submit(contextvars.copy_context().run, fetch_page, set_offset_and_limit(url, offset, limit))
+                   for offset in offsets]
+        for future in futures:
+            yield future.result()
+
+
+def iter_next_pages(next_path: str | None, pages_left: int | None) -> Iterator[dict]:
+    while next_path and (pages_left is None or pages_left > 0):
+        page = fetch_page(BASE_API_URL + next_path.removeprefix("/api"))
+        yield page
+
+        next_path = (page.get("page") or {}).get("next")
+        if pages_left is not None:
+            pages_left -= 1
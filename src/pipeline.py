@@ -0,0 +1,59 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from typing import Callable, Iterable, TypeVar
+
+from src.logging_config import logger
+from src.song_records import SongRowBuffer
+from src.transport import ENRICHMENT_MAX_WORKERS
+
+# Songs discovered but not yet enriched, discovery pauses when this many are waiting
+ENRICHMENT_MAX_PENDING = ENRICHMENT_MAX_WORKERS * 4
+
+T = TypeVar("T")
+
+
+def enrich_as_discovered(discovered: Iterable[T], enrich: Callable[[T], list[dict]],
+                         max_workers: int = ENRICHMENT_MAX_WORKERS,
+                         max_pending: int = ENRICHMENT_MAX_PENDING) -> SongRowBuffer:
+    """
+    Enrich songs on a worker pool while the discovery generator is still producing them.
+
+    The generator runs on the calling thread, so chart pages and playlist diffs are fetched while earlier songs are
+    being enriched. At most max_pending songs are queued at a time, which keeps memory bounded and lets a slow
+    enrichment pool throttle discovery. Each song runs in a copy of the current context, so its requests are
+    accounted to the current stage.
+
+    If discovery raises, e.g. on the chart timeout, the songs that have not started are cancelled and the error is
+    raised straight away. Threads cannot be interrupted, so the songs already being enriched are left to finish their
+    running requests in the background, at most max_workers of them.
+    """
+    song_rows = SongRowBuffer()
+    pending: set[Future] = set()
+
+    def collect(done: set[Future]) -> None:
+        for future in done:
+            pending.discard(future)
+            try:
+                song_rows.extend(future.result())
+            except Exception as e:
+                logger.warning(f"Error enriching song: {e}")
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for item in discovered:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            pending.add(executor.submit(contextvars.copy_context().run, enrich, item))
+
+        collect(wait(pending).done)
+    except BaseException:
+        cancelled = sum(future.cancel() for future in pending)
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"Enrichment stopped, cancelled {cancelled} queued songs and left "
+                       f"{len(pending) - cancelled} running songs to finish")
+        raise
+
+    executor.shutdown()
+    return song_rows
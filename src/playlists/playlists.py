@@ -1,25 +1,35 @@
-import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from typing import Iterator
 
+import numpy as np
 import pandas as pd
 import requests
 from tqdm import tqdm
 
 from src.common_columns import COMMON_COLUMNS
 from src.credentials_key_info import BASE_API_URL, credentials
-from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates
+from src.history import history
+from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates, log_dropped_rows, \
+    record_passed_songs
+from src.language import get_title_languages
 from src.logging_config import logger
 from src.output import process_scrape_output
+from src.pagination import iter_pages
+from src.pipeline import enrich_as_discovered
+from src.run_journal import get_run_journal
 from src.session_manager import session
 from src.sheets_utils import add_past_appearances_to_df, drop_songs_that_appeared_in_past
-from src.song_info import get_all_song_info
-from src.utils import get_uuid_from_url, convert_dataframe_to_csv, \
-    get_remaining_api_quota_from_headers_and_update_remaining_quota
+from src.song_info import get_song_info_rows
+from src.result_store import write_results
+from src.utils import get_uuid_from_url
 
 playlist_columns = ["date_added",
                     "playlist_name"] + COMMON_COLUMNS
 
+# Repeated for every track of a tracklist, so stored as categories. The crawl date stays a string as it is compared
+# and converted to dates, which unordered categories do not support
+TRACKLIST_CATEGORICAL_COLUMNS = ["playlist_name", "playlist_uuid", "playlist_platform"]
+
 
 def get_start_end_datetime(start: str, end: str) -> tuple[datetime, datetime]:
     start = datetime.fromisoformat(start + "T00:00:00+00:00")
@@ -35,8 +45,7 @@ def scrape_tracklist_dates(uuid: str, tracklisting_dates: list[str]) -> pd.DataF
     for date in tracklisting_dates:
         tracklist_ls.append(get_playlist_tracklist_on_date_from_uuid_with_playlist_info(uuid, date))
 
-    tracklist_df = pd.concat(tracklist_ls, ignore_index=True)
-    return tracklist_df
+    return concat_tracklist_dfs(tracklist_ls)
 
 
 def get_tracklist_df_for_today_and_yesterday_and_playlist_info(uuid: str) -> (pd.DataFrame, pd.DataFrame):
@@ -101,7 +110,7 @@ def get_songs_added_to_playlist_in_last_day(uuid: str) -> pd.DataFrame:
           pd.DataFrame: DataFrame of new songs added to the playlist.
       """
     today_tracklist_df, yesterday_tracklist_df = get_tracklist_df_for_today_and_yesterday_and_playlist_info(uuid)
-    combined_df = pd.concat([today_tracklist_df, yesterday_tracklist_df], ignore_index=True)
+    combined_df = concat_tracklist_dfs([today_tracklist_df, yesterday_tracklist_df])
     combined_df = remove_songs_not_added_on_latest_crawl_date(combined_df)
     combined_df_uuids = set(combined_df['song_uuid'])
     yesterday_length, today_length = len(yesterday_tracklist_df), len(today_tracklist_df)
@@ -128,48 +137,83 @@ def copy_over_playlist_info(copy_from, copy_to):
     return copy_to
 
 
-def get_song_info_and_combine_with_playlist_info(tracklist: pd.DataFrame) -> pd.DataFrame:
+def enrich_playlist_song(song: dict, source: str = "playlist") -> list[dict]:
+    # Reuse the song if it was already finished earlier in today's run
+    journal_key = f"{song['playlist_uuid']}:{song['song_uuid']}:{song['playlist_crawl_date']}"
+    rows = get_run_journal().get("playlist", journal_key)
+
+    if rows is None:
+        rows = [copy_over_playlist_info(song, row) for row in get_song_info_rows(song["song_uuid"], source)]
+        get_run_journal().record("playlist", journal_key, rows)
+    else:
+        # Candidates not yet flushed to the history when the earlier run crashed are recorded again
+        history.record_candidates(rows, source, "enriched")
+
+    return rows
+
+
+def get_song_info_and_combine_with_playlist_info(tracklist: pd.DataFrame, source: str = "playlist") -> pd.DataFrame:
     if tracklist.empty:
         return pd.DataFrame()
 
-    result_ls = []
+    song_rows = enrich_as_discovered(tracklist.to_dict("records"), lambda song: enrich_playlist_song(song, source))
+    return song_rows.to_df()
 
-    def process_song(song):
-        song_info_df = get_all_song_info(song["song_uuid"])
-        return copy_over_playlist_info(song, song_info_df)
 
-    # Use ThreadPoolExecutor to process songs in parallel
-    with ThreadPoolExecutor() as executor:
-        future_to_song = {
-            executor.submit(process_song, song): song
-            for _, song in tracklist.iterrows()
-        }
+def discover_songs_added_to_playlists(playlist_list: list[str]) -> Iterator[dict]:
+    """
+    Yield the songs added to each playlist in the last day as soon as the diff for that playlist is known.
+    """
+    for playlist_url in tqdm(playlist_list):
+        uuid: str = get_uuid_from_url(playlist_url)
+        tracklist: pd.DataFrame = get_songs_added_to_playlist_in_last_day(uuid)
+        if not tracklist.empty:
+            get_title_languages().prime(tracklist["song_name"])
+        yield from tracklist.to_dict("records")
 
-        for future in as_completed(future_to_song):
-            try:
-                result_ls.append(future.result())
-            except Exception as e:
-                # Handle exceptions if needed, e.g., log errors
-                print(f"Error processing song: {e}")
 
-    if not result_ls:
-        return pd.DataFrame()
+def add_tracklist_items_to_columns(items: list[dict], columns: dict[str, list]) -> None:
+    for item in items:
+        song = item["song"]
+        columns["song_name"].append(song["name"])
+        columns["song_uuid"].append(song["uuid"])
+        columns["position"].append(item.get("position"))
 
-    return pd.concat(result_ls, ignore_index=True)
 
+def repeat_as_categorical(value, length: int) -> pd.Categorical:
+    """
+    A column repeating one value, stored as a single category and a code per row.
+    """
+    if value is None:
+        return pd.Categorical([None] * length)
+    return pd.Categorical.from_codes(np.zeros(length, dtype=np.int8), categories=[value])
+
+
+def convert_tracklist_to_df(columns: dict[str, list], related: dict) -> pd.DataFrame:
+    length = len(columns["song_uuid"])
+    playlist_metadata = related["playlist"]
+
+    return pd.DataFrame({
+        "song_name": columns["song_name"],
+        "song_uuid": columns["song_uuid"],
+        "position": pd.array(columns["position"], dtype="Int32"),
+        "playlist_name": repeat_as_categorical(playlist_metadata.get("name"), length),
+        "playlist_uuid": repeat_as_categorical(playlist_metadata.get("uuid"), length),
+        "playlist_platform": repeat_as_categorical(playlist_metadata.get("platform"), length),
+        # Note do not use latestCrawlDate as it updates any time they get new data use the date from the related object
+        "playlist_crawl_date": [related.get("date")] * length,
+    })
 
-def convert_tracklist_to_df(tracklist: list[dict]) -> pd.DataFrame:
-    tracklist_df_ls = []
-    for track in tracklist:
-        row: pd.DataFrame = pd.DataFrame(
-            {
-                "song_name": [track["name"]],
-                "song_uuid": [track["uuid"]],
-            }
-        )
-        tracklist_df_ls.append(row)
 
-    tracklist_df = pd.concat(tracklist_df_ls, ignore_index=True)
+def concat_tracklist_dfs(tracklist_dfs: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concat tracklists keeping the playlist metadata categorical, pandas falls back to object columns when the
+    categories differ between frames.
+    """
+    tracklist_df = pd.concat(tracklist_dfs, ignore_index=True)
+    for column in TRACKLIST_CATEGORICAL_COLUMNS:
+        if column in tracklist_df.columns:
+            tracklist_df[column] = tracklist_df[column].astype("category")
     return tracklist_df
 
 
@@ -177,32 +221,19 @@ def get_playlist_tracklist_on_date_from_uuid_with_playlist_info(
         uuid: str, date_and_time: str
 ) -> pd.DataFrame:
     try:
-        tracklist: list[dict] = []
+        # Each page is parsed straight into the columns so only one frame is built per tracklist
+        columns: dict[str, list] = {"song_name": [], "song_uuid": [], "position": []}
 
-        _next: str = "0"
-        while _next is not None:
-            url = BASE_API_URL + f"/v2.20/playlist/{uuid}/tracks/{date_and_time}?offset={str(_next)}&limit=100"
-            response_json = session.get(url, headers=credentials).json()
+        related = None
+        for page in iter_pages(BASE_API_URL + f"/v2.20/playlist/{uuid}/tracks/{date_and_time}"):
+            related = related or page["related"]
 
-            items = response_json.get("items")
+            items = page.get("items")
             if not items:
                 break
-            songs: list[dict] = [item["song"] for item in items]
-            tracklist += songs
+            add_tracklist_items_to_columns(items, columns)
 
-            _next = response_json["page"]["next"]
-
-        tracklist_df = convert_tracklist_to_df(tracklist)
-
-        playlist_metadata = response_json["related"]["playlist"]
-        tracklist_df["playlist_name"] = playlist_metadata.get("name")
-        tracklist_df["playlist_uuid"] = playlist_metadata.get("uuid")
-        tracklist_df["playlist_platform"] = playlist_metadata.get("platform")
-
-        # Note do not use latestCrawlDate as it updates any time they get new data use the date from the related object
-        tracklist_df["playlist_crawl_date"] = response_json["related"].get("date")
-
-        return tracklist_df
+        return convert_tracklist_to_df(columns, related)
 
     except Exception as e:
         logger.debug(f"Error in get_playlist_tracklist_on_date_from_uuid {e}")
@@ -228,25 +259,33 @@ def get_available_tracklisting_dates(playlist_uuid: str) -> list[str]:
         except Exception as e:
             logger.debug(f"Failed to get available tracklisting dates for {playlist_uuid} - {e}")
             return []
-
-    get_remaining_api_quota_from_headers_and_update_remaining_quota(response)
     return all_dates
 
 
-def run_playlist_scrape(playlist_list) -> tuple[str, pd.DataFrame, str]:
+def scrape_playlists(playlist_list) -> pd.DataFrame:
+    """
+    Get the complete song info for the songs added to each playlist in the last day, before any filtering.
+    """
     logger.info("Scraping playlist data!".center(100, "-"))
 
-    result_list: list[pd.DataFrame] = [pd.DataFrame(columns=playlist_columns)]
+    # Songs from earlier playlists are enriched while the later playlists are still being diffed
+    song_rows = enrich_as_discovered(discover_songs_added_to_playlists(playlist_list), enrich_playlist_song)
+    if not song_rows:
+        return pd.DataFrame(columns=playlist_columns)
 
-    for playlist in tqdm(playlist_list):
-        result_df = get_complete_song_info_for_songs_added_to_playlist_in_last_day(playlist)
-        if not result_df.empty:
-            result_list.append(result_df)
+    return song_rows.to_df()
 
-    result_df = pd.concat(result_list, ignore_index=True)
-    result_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df=result_df)
 
+def publish_playlist_scrape(result_df: pd.DataFrame) -> tuple[str, pd.DataFrame, str]:
+    """
+    Filter the scraped playlist songs and publish them to sheets and spotify.
+    """
+    result_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df=result_df, source="playlist")
+
+    filtered_df = result_df
     result_df = drop_songs_that_appeared_in_past(result_df)
+    log_dropped_rows(filtered_df, result_df, "appeared_in_past", source="playlist")
+    record_passed_songs(result_df, "playlist")
     # result_df = add_past_appearances_to_df(result_df)
 
     # Reorder columns
@@ -256,6 +295,10 @@ def run_playlist_scrape(playlist_list) -> tuple[str, pd.DataFrame, str]:
     return process_scrape_output(result_df, "playlist")
 
 
+def run_playlist_scrape(playlist_list) -> tuple[str, pd.DataFrame, str]:
+    return publish_playlist_scrape(scrape_playlists(playlist_list))
+
+
 def run_playlist_history_scrape(playlist_list: list[str], start_day: str, end_day: str) -> pd.DataFrame:
     logger.info("Scraping playlist history data!".center(100, "-"))
 
@@ -288,7 +331,8 @@ def run_playlist_history_scrape(playlist_list: list[str], start_day: str, end_da
         # Remove duplicates based on song_uuid
         tracklist_df = tracklist_df.drop_duplicates('song_uuid', keep='last')
 
-        complete_song_info_df: pd.DataFrame = get_song_info_and_combine_with_playlist_info(tracklist_df)
+        complete_song_info_df: pd.DataFrame = get_song_info_and_combine_with_playlist_info(
+            tracklist_df, source="playlist_history")
         df = complete_song_info_df
         if not df.empty:
             result_list.append(df)
@@ -301,12 +345,13 @@ def run_playlist_history_scrape(playlist_list: list[str], start_day: str, end_da
         return pd.DataFrame()
 
     results = pd.concat(result_list, ignore_index=True)
-    results = apply_follower_stream_listeners_filters_and_drop_duplicates(df=results)
+    results = apply_follower_stream_listeners_filters_and_drop_duplicates(df=results, source="playlist_history")
+    record_passed_songs(results, "playlist_history")
     # Reorder columns
     results = results[playlist_columns]
 
-    OUTPUT_FOLDER = os.getenv("OUPUT_FOLDER", "/app/output")
-    convert_dataframe_to_csv(results, filename=f"{OUTPUT_FOLDER}/playlist_history_{start_day}_{end_day}.csv")
+    # Keyed by the start day as backfills of different ranges can end on the same day
+    write_results(results.assign(start_day=start_day), "playlist_history", end_day, key=start_day)
 
     logger.info("Finished scraping {} songs from playlists".format(len(results)))
     return results
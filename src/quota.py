@@ -0,0 +1,115 @@
+import atexit
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from src.logging_config import logger
+
+load_dotenv()
+
+QUOTA_FLUSH_INTERVAL_SECONDS = 60
+
+
+class QuotaTracker:
+    """
+    Thread safe record of the Soundcharts quota remaining, taken from the X-Quota-Remaining header of each response.
+    The value is kept in memory and written to disk at most once per flush interval and at exit.
+    """
+
+    def __init__(self, path: str, flush_interval: float = QUOTA_FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.first_remaining: int | None = None
+        self.first_seen_at: float | None = None
+        self.lowest_remaining: int | None = None
+        self.last_flushed_at = time.monotonic()
+        self.dirty = False
+
+    def update(self, remaining: int) -> int:
+        """
+        Record a quota reading and return how much quota was consumed since the lowest reading so far. Concurrent
+        responses can arrive out of order, so only a lower reading moves the value.
+        """
+        with self.lock:
+            if self.lowest_remaining is None:
+                self.first_remaining = self.lowest_remaining = remaining
+                self.first_seen_at = time.monotonic()
+                self.dirty = True
+                consumed = 0
+            elif remaining < self.lowest_remaining:
+                consumed = self.lowest_remaining - remaining
+                self.lowest_remaining = remaining
+                self.dirty = True
+            else:
+                consumed = 0
+
+            flush_due = self.dirty and time.monotonic() - self.last_flushed_at >= self.flush_interval
+
+        if flush_due:
+            self.flush()
+        return consumed
+
+    @property
+    def remaining(self) -> int | None:
+        with self.lock:
+            return self.lowest_remaining
+
+    @property
+    def consumed(self) -> int:
+        with self.lock:
+            if self.lowest_remaining is None:
+                return 0
+            return self.first_remaining - self.lowest_remaining
+
+    def consumption_rate_per_minute(self) -> float:
+        with self.lock:
+            if self.lowest_remaining is None:
+                return 0.0
+            minutes = (time.monotonic() - self.first_seen_at) / 60
+            return (self.first_remaining - self.lowest_remaining) / minutes if minutes > 0 else 0.0
+
+    def flush(self) -> None:
+        """
+        Write the remaining quota to a temporary file and rename it over the quota file, so readers never see a
+        partial write.
+        """
+        # Only one thread writes at a time, any others skip as the writer picks up the latest value
+        if not self.flush_lock.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                if not self.dirty:
+                    return
+                remaining = self.lowest_remaining
+                self.dirty = False
+                self.last_flushed_at = time.monotonic()
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(remaining))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.debug(f"Failed to write quota {e}")
+        finally:
+            self.flush_lock.release()
+
+    def summary(self) -> dict:
+        return {
+            "quota_remaining": self.remaining,
+            "quota_consumed": self.consumed,
+            "quota_consumed_per_minute": round(self.consumption_rate_per_minute(), 1),
+        }
+
+
+def get_quota_tracker() -> QuotaTracker:
+    LOGS_FOLDER = os.getenv("LOGS_FOLDER")
+    tracker = QuotaTracker(f"{LOGS_FOLDER}/quota.txt")
+    atexit.register(tracker.flush)
+    return tracker
+
+
+quota_tracker = get_quota_tracker()
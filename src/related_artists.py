@@ -1,11 +1,20 @@
-from dataclasses import dataclass
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
 
+import numpy as np
 import pandas as pd
 import requests
 
 from src.credentials_key_info import BASE_API_URL, credentials
 from src.logging_config import logger
+from src.session_manager import session
 from src.song_info import add_daily_streams_column
+from src.transport import CircuitOpenError
+
+CRAWL_MAX_WORKERS = 10
 
 
 @dataclass
@@ -20,36 +29,156 @@ class Artist:
 def get_related_artists(artist_uuid: str) -> list[Artist]:
     try:
         url = BASE_API_URL + f"/v2/artist/{artist_uuid}/related"
-        response = requests.get(url, headers=credentials)
+        response = session.get(url, headers=credentials)
         artists = response.json().get("items")
         artists = [Artist(name=artist.get("name"), uuid=artist.get("uuid"), slug=artist.get("slug"),
                           appUrl=artist.get("appUrl"), imageUrl=artist.get("imageUrl")) for artist in artists]
         return artists
+    except CircuitOpenError:
+        logger.debug(f"Skipping related artists of {artist_uuid} while the endpoint is failing")
+        return None
+    except requests.RequestException:
+        raise
     except Exception as e:
-        print(e)
+        logger.debug(f"Failed getting related artists for {artist_uuid} {e}")
         return None
 
 
-def get_related_artists_and_their_related_artists(artist_uuid: str):
-    result = []
-    initial_related_artists: list[Artist] = get_related_artists(artist_uuid)
-    result.extend(initial_related_artists)
+class RelatedArtistGraphStore:
+    """
+    On disk adjacency list of the related artist graph.
+
+    Each crawled artist is stored with its related artist uuids and the time it was last refreshed, artists that were
+    only seen as a related artist are stored without an adjacency list.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.artists: dict[str, dict] = {}
+        self.adjacency: dict[str, dict] = {}
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.artists = data.get("artists", {})
+            self.adjacency = data.get("adjacency", {})
+            logger.info(f"Loaded related artist graph with {len(self.adjacency)} crawled artists from {path}")
+
+    def is_fresh(self, artist_uuid: str, max_age: timedelta) -> bool:
+        node = self.adjacency.get(artist_uuid)
+        if node is None:
+            return False
+
+        refreshed_at = datetime.fromisoformat(node["refreshed_at"])
+        return datetime.now(tz=timezone.utc) - refreshed_at < max_age
+
+    def get_related_uuids(self, artist_uuid: str) -> list[str]:
+        return self.adjacency[artist_uuid]["related"]
+
+    def set_related_artists(self, artist_uuid: str, related_artists: list[Artist]) -> None:
+        for artist in related_artists:
+            self.artists[artist.uuid] = asdict(artist)
+
+        self.adjacency[artist_uuid] = {
+            "related": [artist.uuid for artist in related_artists],
+            "refreshed_at": datetime.now(tz=timezone.utc).isoformat(),
+        }
+
+    def get_artist(self, artist_uuid: str) -> Artist | None:
+        artist = self.artists.get(artist_uuid)
+        return Artist(**artist) if artist else None
+
+    def save(self) -> None:
+        # Write to a temporary file first so a crash never leaves a half written graph
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump({"artists": self.artists, "adjacency": self.adjacency}, f)
+        os.replace(temporary_path, self.path)
+        logger.info(f"Saved related artist graph with {len(self.adjacency)} crawled artists to {self.path}")
+
+
+def get_related_artist_graph_store() -> RelatedArtistGraphStore:
+    OUTPUT_FOLDER = os.getenv("OUTPUT_FOLDER")
+    return RelatedArtistGraphStore(f"{OUTPUT_FOLDER}/related_artists_graph.json")
+
+
+def crawl_related_artists(seed_artist_uuids: list[str], depth: int = 2,
+                          max_age: timedelta = timedelta(days=7),
+                          store: RelatedArtistGraphStore | None = None) -> dict[str, list[str]]:
+    """
+    Breadth first crawl of the related artist graph around the seed artists.
+
+    Every artist is expanded at most once, artists refreshed within max_age are read from the store instead of being
+    refetched, and each level of the crawl is fetched in parallel.
+
+    Returns:
+        The adjacency list of every artist expanded in the crawl
+    """
+    if store is None:
+        store = get_related_artist_graph_store()
+
+    visited: set[str] = set(seed_artist_uuids)
+    frontier: list[str] = list(dict.fromkeys(seed_artist_uuids))
+    adjacency: dict[str, list[str]] = {}
+
+    try:
+        for level in range(depth):
+            stale_uuids = [uuid for uuid in frontier if not store.is_fresh(uuid, max_age)]
+            logger.info(f"Crawling level {level + 1}/{depth}: {len(frontier)} artists, {len(stale_uuids)} to refresh")
+
+            with ThreadPoolExecutor(max_workers=CRAWL_MAX_WORKERS) as executor:
+                future_to_uuid = {executor.submit(get_related_artists, uuid): uuid for uuid in stale_uuids}
+
+                for future in as_completed(future_to_uuid):
+                    artist_uuid = future_to_uuid[future]
+                    try:
+                        related_artists = future.result()
+                    except Exception as e:
+                        logger.warning(f"Failed getting related artists for {artist_uuid}: {e}")
+                        continue
+                    if related_artists is not None:
+                        store.set_related_artists(artist_uuid, related_artists)
+
+            next_frontier = []
+            for uuid in frontier:
+                if uuid not in store.adjacency:
+                    continue
+
+                related_uuids = store.get_related_uuids(uuid)
+                adjacency[uuid] = related_uuids
+                for related_uuid in related_uuids:
+                    if related_uuid not in visited:
+                        visited.add(related_uuid)
+                        next_frontier.append(related_uuid)
+
+            frontier = next_frontier
+            if not frontier:
+                break
+    finally:
+        # Keep the artists fetched before a failure
+        store.save()
+
+    return adjacency
 
-    for artist in initial_related_artists:
-        result.extend(get_related_artists(artist.uuid))
 
-    return result
+def get_related_artists_and_their_related_artists(artist_uuid: str) -> list[Artist]:
+    store = get_related_artist_graph_store()
+    adjacency = crawl_related_artists([artist_uuid], depth=2, store=store)
+
+    related_uuids = dict.fromkeys(uuid for related in adjacency.values() for uuid in related if uuid != artist_uuid)
+    return [store.get_artist(uuid) for uuid in related_uuids if store.get_artist(uuid)]
 
 
 def get_artist_streaming_audience(artist_uuid: str, start_date: str | None = None, end_date: str | None = None,
                                   platforn: str = "spotify"):
-    url = BASE_API_URL + f"/v2/artist/{artist_uuid}/streaming/{platforn}/listening?"
+    url = BASE_API_URL + f"/v2/artist/{artist_uuid}/streaming/{platforn}/listening"
+    params = {}
     if start_date:
-        url += f"?startDate={start_date}"
+        params["startDate"] = start_date
     if end_date:
-        url += f"&endDate={end_date}"
+        params["endDate"] = end_date
 
-    response = requests.get(url, headers=credentials)
+    response = session.get(url, headers=credentials, params=params)
     days = response.json().get("items")
 
     stream_dict = {}
@@ -63,20 +192,84 @@ def get_artist_streaming_audience(artist_uuid: str, start_date: str | None = Non
     return stream_data_df
 
 
-def get_artist_average_streams_12_months_ago(artist_uuid: str):
+def get_baseline_windows(months_ago: tuple[int, ...], window_months: int) -> list[tuple[str, str]]:
+    """
+    Get the (start_date, end_date) of a window of window_months starting each of the months_ago.
+    """
     today = pd.Timestamp.now()
-    twelve_months_ago = (today - pd.DateOffset(months=12)).strftime("%Y-%m-%d")
-    eleven_months_ago = (today - pd.DateOffset(months=11)).strftime("%Y-%m-%d")
-    stream_data_df = get_artist_streaming_audience(artist_uuid, start_date=twelve_months_ago,
-                                                   end_date=eleven_months_ago)
-    logger.info(f"Got stream data for {artist_uuid} from {twelve_months_ago} to {eleven_months_ago}")
+    return [
+        ((today - pd.DateOffset(months=months)).strftime("%Y-%m-%d"),
+         (today - pd.DateOffset(months=months - window_months)).strftime("%Y-%m-%d"))
+        for months in months_ago
+    ]
+
+
+def get_artist_baseline_average_streams(artist_uuids: list[str], months_ago: tuple[int, ...] = (12, 6, 3),
+                                        window_months: int = 1) -> pd.DataFrame:
+    """
+    Get the average daily streams of many artists over several baseline windows.
+
+    Only the date range of each window is fetched, all artist and window pairs are fetched in parallel and the means
+    are computed in one pass over all the fetched daily streams.
 
-    # Remove rows that are not between the start and end date
-    stream_data_df = stream_data_df[stream_data_df["date"] >= twelve_months_ago]
-    stream_data_df = stream_data_df[stream_data_df["date"] <= eleven_months_ago]
-    print(stream_data_df)
+    Returns:
+        DataFrame indexed by artist_uuid with an average_daily_streams_{months}_months_ago column per window
+    """
+    artist_uuids = list(dict.fromkeys(artist_uuids))
+    windows = get_baseline_windows(months_ago, window_months)
+    window_count = len(windows)
 
-    return stream_data_df["daily_streams"].mean()
+    daily_streams_chunks = []
+    group_chunks = []
+
+    with ThreadPoolExecutor(max_workers=CRAWL_MAX_WORKERS) as executor:
+        future_to_group = {
+            executor.submit(get_artist_streaming_audience, artist_uuid, start_date, end_date):
+                (artist_index * window_count + window_index, artist_uuid)
+            for artist_index, artist_uuid in enumerate(artist_uuids)
+            for window_index, (start_date, end_date) in enumerate(windows)
+        }
+
+        for future in as_completed(future_to_group):
+            group, artist_uuid = future_to_group[future]
+            try:
+                stream_data_df = future.result()
+            except Exception as e:
+                logger.warning(f"Failed getting stream data for {artist_uuid}: {e}")
+                continue
+
+            # Remove rows that are not between the start and end date
+            start_date, end_date = windows[group % window_count]
+            in_window = (stream_data_df["date"] >= start_date) & (stream_data_df["date"] <= end_date)
+            daily_streams = stream_data_df.loc[in_window, "daily_streams"].to_numpy(dtype=float)
+
+            daily_streams_chunks.append(daily_streams)
+            group_chunks.append(np.full(len(daily_streams), group))
+
+    group_total = len(artist_uuids) * window_count
+    if daily_streams_chunks:
+        daily_streams = np.concatenate(daily_streams_chunks)
+        groups = np.concatenate(group_chunks)
+    else:
+        daily_streams = np.empty(0)
+        groups = np.empty(0, dtype=int)
+
+    has_value = ~np.isnan(daily_streams)
+    sums = np.bincount(groups[has_value], weights=daily_streams[has_value], minlength=group_total)
+    counts = np.bincount(groups[has_value], minlength=group_total)
+    means = np.divide(sums, counts, out=np.full(group_total, np.nan), where=counts > 0)
+
+    return pd.DataFrame(
+        means.reshape(len(artist_uuids), window_count),
+        index=pd.Index(artist_uuids, name="artist_uuid"),
+        columns=[f"average_daily_streams_{months}_months_ago" for months in months_ago],
+    )
+
+
+def get_artist_average_streams_12_months_ago(artist_uuid: str):
+    baseline_df = get_artist_baseline_average_streams([artist_uuid], months_ago=(12,))
+    return baseline_df.iloc[0, 0]
 
 
-print(get_artist_average_streams_12_months_ago("ca22091a-3c00-11e9-974f-549f35141000"))
+if __name__ == "__main__":
+    print(get_artist_baseline_average_streams(["ca22091a-3c00-11e9-974f-549f35141000"]))
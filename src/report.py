@@ -1,31 +1,84 @@
-import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+import os
+
 import pandas as pd
-from gspread_dataframe import get_as_dataframe, set_with_dataframe
+from gspread_dataframe import get_as_dataframe
 
 import src.sheets_utils as sheets_utils
 from src import utils
 from src.logging_config import logger
 from src.song_info import get_song_audience_from_date, get_song_metadata
 
+REPORT_MAX_WORKERS = 10
+
 
-def get_last_year_audience_for_list_of_songs(uuid_start: list[tuple[str, str]]) -> dict[str, pd.DataFrame]:
+def get_song_metadata_for_list_of_songs(uuids: list[str]) -> dict[str, SimpleNamespace]:
+    """
+    Fetch the metadata for every unique uuid once, in parallel, so it can be shared by every step of the report.
+    """
+    unique_uuids = list(dict.fromkeys(uuids))
     result_dict = {}
-    for uuid, oldest_day_to_collect in uuid_start:
 
-        if pd.isna(oldest_day_to_collect) or oldest_day_to_collect == "release":
-            song_release_date = get_song_metadata(uuid).releaseDate
-            song_release_date = str(pd.to_datetime(song_release_date).date())
-            # song_name = get_song_metadata(uuid).name
-            # print(song_name, song_release_date)
-            oldest_day_to_collect = song_release_date
+    with ThreadPoolExecutor(max_workers=REPORT_MAX_WORKERS) as executor:
+        future_to_uuid = {executor.submit(get_song_metadata, uuid): uuid for uuid in unique_uuids}
+
+        for future in as_completed(future_to_uuid):
+            uuid = future_to_uuid[future]
+            try:
+                song_metadata = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to get metadata for song {uuid}: {e}")
+                continue
+            if song_metadata is None:
+                logger.warning(f"Failed to get metadata for song {uuid}")
+                continue
+            result_dict[uuid] = song_metadata
+
+    return result_dict
 
-        df = get_song_audience_from_date(uuid, oldest_day_to_collect)
 
-        # Set the index to date column
-        df.set_index("date", inplace=True)
-        result_dict[uuid] = df
+def get_song_audience_for_report(uuid: str, oldest_day_to_collect: str,
+                                 song_metadata: SimpleNamespace | None) -> pd.DataFrame:
+    if pd.isna(oldest_day_to_collect) or oldest_day_to_collect == "release":
+        song_release_date = song_metadata.releaseDate
+        song_release_date = str(pd.to_datetime(song_release_date).date())
+        oldest_day_to_collect = song_release_date
 
-    return result_dict
+    df = get_song_audience_from_date(uuid, oldest_day_to_collect)
+
+    # Set the index to date column
+    df.set_index("date", inplace=True)
+    return df
+
+
+def get_last_year_audience_for_list_of_songs(uuid_start: list[tuple[str, str]],
+                                             song_metadata_dict: dict[str, SimpleNamespace]) -> dict[str, pd.DataFrame]:
+    """
+    Fetch the audience history of every song in parallel, using the already fetched metadata for release dates.
+    The returned dict keeps the order of uuid_start.
+    """
+    audience_dict = {}
+
+    with ThreadPoolExecutor(max_workers=REPORT_MAX_WORKERS) as executor:
+        future_to_uuid = {}
+        for uuid, oldest_day_to_collect in uuid_start:
+            if uuid not in song_metadata_dict:
+                logger.warning(f"Skipping song {uuid} in report as it has no metadata")
+                continue
+            future = executor.submit(get_song_audience_for_report, uuid, oldest_day_to_collect,
+                                     song_metadata_dict[uuid])
+            future_to_uuid[future] = uuid
+
+        for future in as_completed(future_to_uuid):
+            uuid = future_to_uuid[future]
+            try:
+                audience_dict[uuid] = future.result()
+            except Exception as e:
+                logger.warning(f"Failed to get audience for song {uuid} in report: {e}")
+
+    return {uuid: audience_dict[uuid] for uuid, _ in uuid_start if uuid in audience_dict}
 
 
 def get_input_song_uuids_and_start_date_from_sheets() -> list[tuple[str, str]]:
@@ -65,15 +118,17 @@ def calculate_total_streams(df):
     return df_sorted
 
 
-def combine_song_dataframes(dataframes: dict[str, pd.DataFrame]) -> pd.DataFrame:
+def combine_song_dataframes(dataframes: dict[str, pd.DataFrame], song_names: dict[str, str]) -> pd.DataFrame:
     """
     Combine multiple song DataFrames into a single comprehensive DataFrame.
 
     Parameters:
     -----------
     dataframes : dict
-        A dictionary where keys are song names and values are pandas DataFrames.
+        A dictionary where keys are song uuids and values are pandas DataFrames.
         Each DataFrame should have date as the index and a 'daily_streams' column.
+    song_names : dict
+        A dictionary mapping each song uuid to its song name.
 
     Returns:
     --------
@@ -85,35 +140,26 @@ def combine_song_dataframes(dataframes: dict[str, pd.DataFrame]) -> pd.DataFrame
     Example:
     --------
     song_dfs = {
-        'Song1': df1,
-        'Song2': df2,
+        'uuid1': df1,
+        'uuid2': df2,
         # ... more song DataFrames
     }
-    combined_df = combine_song_dataframes(song_dfs)
+    combined_df = combine_song_dataframes(song_dfs, {'uuid1': 'Song1', 'uuid2': 'Song2'})
     """
     # Validate input
     if not isinstance(dataframes, dict) or len(dataframes) == 0:
         raise ValueError("Input must be a non-empty dictionary of DataFrames")
 
-    # Find all unique dates across all DataFrames
-    all_dates = sorted(set().union(*[df.index for df in dataframes.values()]))
-
-    # Create a list to store processed DataFrames
-    daily_stream_dfs = []
+    # Stack every song into one long (date, song, daily_streams) table
+    long_df = pd.concat(
+        [df[["daily_streams"]].assign(song=uuid) for uuid, df in dataframes.items()]
+    ).rename_axis("date").reset_index()
+    long_df = long_df.drop_duplicates(subset=["date", "song"])
 
-    for uuid, df in dataframes.items():
-        # Reindex DataFrame to include all dates, filling missing values with 0
-        reindexed_df = df.reindex(all_dates, fill_value=np.nan)
-
-        # Get the song name from the UUID
-        song_name = get_song_metadata(uuid).name
-        # Keep only the 'daily_streams' column and rename it to the song name
-        daily_streams = reindexed_df['daily_streams'].rename(song_name + ' daily_streams')
-        # Append to the list of processed DataFrames
-        daily_stream_dfs.append(daily_streams)
-
-    # Combine all individual daily streams into one DataFrame
-    df = pd.concat(daily_stream_dfs, axis=1)
+    # Pivot into one column per song over the union of all dates, keeping the input order of the songs
+    df = long_df.pivot(index="date", columns="song", values="daily_streams")
+    df = df.reindex(columns=list(dataframes))
+    df.columns = [song_names.get(uuid, uuid) + ' daily_streams' for uuid in df.columns]
 
     # Calculate cumulative daily streams across all songs
     df['cumulative_daily_streams'] = df.sum(axis=1)
@@ -125,8 +171,13 @@ def combine_song_dataframes(dataframes: dict[str, pd.DataFrame]) -> pd.DataFrame
 
 def make_report():
     uuid_start_tuples: list[tuple[str, str]] = get_input_song_uuids_and_start_date_from_sheets()
-    last_year_audience = get_last_year_audience_for_list_of_songs(uuid_start_tuples)
-    combined_df = combine_song_dataframes(last_year_audience)
+
+    # Fetch the metadata once per song and share it between the audience and naming steps
+    song_metadata_dict = get_song_metadata_for_list_of_songs([uuid for uuid, _ in uuid_start_tuples])
+    song_names = {uuid: song_metadata.name for uuid, song_metadata in song_metadata_dict.items()}
+
+    last_year_audience = get_last_year_audience_for_list_of_songs(uuid_start_tuples, song_metadata_dict)
+    combined_df = combine_song_dataframes(last_year_audience, song_names)
 
     return combined_df
 
@@ -136,7 +187,11 @@ def set_report_data_on_sheets():
     report_data_sheet = spreadsheet.worksheet("report_data")
 
     df = make_report()
-    set_with_dataframe(report_data_sheet, df, resize=True, include_index=True)
+
+    # Only append the new dates and rewrite the changed columns since the last time the report was published
+    LOGS_FOLDER = os.getenv("LOGS_FOLDER")
+    sheets_utils.set_dataframe_on_worksheet_incrementally(report_data_sheet, df,
+                                                          mirror_path=f"{LOGS_FOLDER}/report_data.pkl")
     logger.info("Set report data on sheets")
 
 
@@ -0,0 +1,155 @@
+import os
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from dotenv import load_dotenv
+
+from src.logging_config import logger
+
+load_dotenv()
+
+PARTITION_SCHEMA = pa.schema([("scrape_type", pa.string()), ("scrape_date", pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+# Columns that can hold "N/A" or other strings from the API alongside numbers
+NUMERIC_COLUMNS = [
+    "main_artist_tiktok_followers",
+    "main_artist_spotify_followers",
+    "main_artist_spotify_monthly_listeners",
+    "main_artist_spotify_conversion_rate",
+    "instrumentalness",
+    "duration",
+    "today_streams",
+    "yesterday_streams",
+    "this_week_7_day_average",
+    "last_week_7_day_average",
+    "week_to_week_percentage_increase",
+    "day_1-3_average",
+    "day_7-9_average",
+    "%_increase",
+    "14_day_median",
+    "14_day_max",
+    "total_streams",
+    "time_on_chart",
+    "position",
+]
+DATE_COLUMNS = ["release_date", "date_added", "playlist_crawl_date", "date_added_to_watchlist", "start_day"]
+
+
+def get_result_dataset_folder() -> str:
+    OUTPUT_FOLDER = os.getenv("OUTPUT_FOLDER")
+    return f"{OUTPUT_FOLDER}/results"
+
+
+def to_typed_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Give every column a fixed type so the files of different days can be read as one dataset. Numbers are stored as
+    doubles, dates as dates and everything else as strings.
+    """
+    typed_df = pd.DataFrame(index=range(len(df)))
+    fields = []
+    for column in df.columns:
+        values = df[column].reset_index(drop=True)
+        if column in NUMERIC_COLUMNS:
+            typed_df[column] = pd.to_numeric(values, errors="coerce").astype("float64")
+            fields.append(pa.field(column, pa.float64()))
+        elif column in DATE_COLUMNS:
+            typed_df[column] = pd.to_datetime(values, errors="coerce").dt.date
+            fields.append(pa.field(column, pa.date32()))
+        elif pd.api.types.is_bool_dtype(values):
+            typed_df[column] = values
+            fields.append(pa.field(column, pa.bool_()))
+        elif pd.api.types.is_numeric_dtype(values):
+            typed_df[column] = values.astype("float64")
+            fields.append(pa.field(column, pa.float64()))
+        else:
+            typed_df[column] = values.astype("string")
+            fields.append(pa.field(column, pa.string()))
+
+    return pa.Table.from_pandas(typed_df, schema=pa.schema(fields), preserve_index=False)
+
+
+def write_results(df: pd.DataFrame, scrape_type: str, date: str, key: str | None = None) -> None:
+    """
+    Write the results of a scrape to its scrape_type/scrape_date partition of the dataset, replacing any results
+    already written for that day. With a key, e.g. the start day of a playlist history backfill, only the results
+    written with the same key are replaced, so backfills ending on the same day are kept side by side.
+    """
+    table = to_typed_table(df)
+    table = table.append_column("scrape_type", pa.array([scrape_type] * len(table), pa.string()))
+    table = table.append_column("scrape_date", pa.array([date] * len(table), pa.string()))
+
+    folder = get_result_dataset_folder()
+    if key is None:
+        basename_template = f"part-{uuid.uuid4().hex}-{{i}}.parquet"
+        existing_data_behavior = "delete_matching"
+    else:
+        partition_folder = Path(folder) / f"scrape_type={scrape_type}" / f"scrape_date={date}"
+        for path in partition_folder.glob(f"part-{key}-*.parquet"):
+            path.unlink()
+        basename_template = f"part-{key}-{uuid.uuid4().hex}-{{i}}.parquet"
+        existing_data_behavior = "overwrite_or_ignore"
+
+    ds.write_dataset(
+        table,
+        folder,
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template=basename_template,
+        existing_data_behavior=existing_data_behavior,
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+    logger.info(f"Wrote {len(table)} {scrape_type} results for {date} to {folder}")
+
+
+def get_partition_filter(scrape_type: str | None = None, start_date: str | None = None,
+                         end_date: str | None = None) -> ds.Expression | None:
+    expressions = []
+    if scrape_type:
+        expressions.append(ds.field("scrape_type") == scrape_type)
+    if start_date:
+        expressions.append(ds.field("scrape_date") >= start_date)
+    if end_date:
+        expressions.append(ds.field("scrape_date") <= end_date)
+
+    if not expressions:
+        return None
+
+    expression = expressions[0]
+    for other in expressions[1:]:
+        expression = expression & other
+    return expression
+
+
+def read_results(scrape_type: str | None = None, start_date: str | None = None, end_date: str | None = None,
+                 columns: list[str] | None = None, filter: ds.Expression | None = None) -> pd.DataFrame:
+    """
+    Read results across days. Partitions outside the scrape type and date range are skipped without being opened,
+    only the requested columns are read and the filter is checked against the row group statistics, e.g.
+
+        read_results("chart", start_date="2024-11-01", columns=["song_uuid", "today_streams"],
+                     filter=ds.field("total_streams") < 100000)
+    """
+    folder = get_result_dataset_folder()
+    if not os.path.exists(folder):
+        return pd.DataFrame(columns=columns)
+
+    partition_filter = get_partition_filter(scrape_type, start_date, end_date)
+    dataset = ds.dataset(folder, format="parquet", partitioning=PARTITIONING)
+    fragments = list(dataset.get_fragments(filter=partition_filter))
+    if not fragments:
+        return pd.DataFrame(columns=columns)
+
+    # Scrape types have different columns, so the schema is the union of the files being read
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in fragments] + [PARTITION_SCHEMA])
+    dataset = ds.dataset([fragment.path for fragment in fragments], schema=schema, format="parquet",
+                         partitioning=PARTITIONING, partition_base_dir=folder)
+
+    expression = filter
+    if partition_filter is not None:
+        expression = partition_filter if expression is None else partition_filter & expression
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.logging_config import logger
+
+load_dotenv()
+
+JOURNAL_RETENTION_DAYS = 7
+
+
+def to_json_value(value):
+    # numpy scalars come from the pandas calculations of the metrics
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class RunJournal:
+    """
+    Append only journal of the work finished during a run.
+
+    Every enriched song is written as a line of JSON as soon as it completes, so a run that is restarted on the same
+    day can reuse the finished songs instead of fetching them again. Songs that were filtered out are recorded with
+    no rows so they are skipped as well.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[str, str], list[dict]] = {}
+
+        if os.path.exists(path):
+            self.load()
+
+        self.file = open(path, mode="a", encoding="utf-8")
+
+    def load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be cut short if the previous run crashed while writing it
+                    continue
+                self.entries[(entry["stage"], entry["key"])] = entry["rows"]
+
+        logger.info(f"Resuming run from journal {self.path} with {len(self.entries)} finished entries")
+
+    def get(self, stage: str, key: str) -> list[dict] | None:
+        """
+        Get the rows recorded for the key, or None if the work has not been finished in this run.
+        """
+        return self.entries.get((stage, key))
+
+    def get_stage(self, stage: str) -> list[dict]:
+        return [row for (entry_stage, _), rows in self.entries.items() if entry_stage == stage for row in rows]
+
+    def record(self, stage: str, key: str, rows: list[dict]) -> None:
+        line = json.dumps({"stage": stage, "key": key, "rows": rows}, default=to_json_value)
+
+        with self.lock:
+            self.entries[(stage, key)] = rows
+            self.file.write(line + "\n")
+            self.file.flush()
+
+
+def remove_old_journals(journal_folder: Path) -> None:
+    for journal_path in journal_folder.glob("run_*.jsonl"):
+        if time.time() - journal_path.stat().st_mtime > JOURNAL_RETENTION_DAYS * 24 * 60 * 60:
+            journal_path.unlink()
+            logger.debug(f"Removed old run journal {journal_path}")
+
+
+def get_run_journal_for_today() -> RunJournal:
+    LOGS_FOLDER = os.getenv("LOGS_FOLDER")
+    journal_folder = Path(f"{LOGS_FOLDER}/journal")
+    journal_folder.mkdir(parents=True, exist_ok=True)
+    remove_old_journals(journal_folder)
+
+    date = str(datetime.now().date())
+    return RunJournal(str(journal_folder / f"run_{date}.jsonl"))
+
+
+_run_journal: RunJournal | None = None
+_run_journal_lock = threading.Lock()
+
+
+def get_run_journal() -> RunJournal:
+    """
+    Open today's journal on first use, so modules importing run_journal do not create or prune journal files.
+    """
+    global _run_journal
+    with _run_journal_lock:
+        if _run_journal is None:
+            _run_journal = get_run_journal_for_today()
+    return _run_journal
@@ -4,22 +4,33 @@ import cronitor
 import pandas as pd
 
 from src import input_lists
-from src.charts.charts import run_charts_scrape
+from src.charts.charts import scrape_all_charts, publish_chart_scrape
 from src.credentials_key_info import cronitor_api_key
-from src.general_ranking.general_ranking import run_general_ranking_scrape, get_song_ranking
-from src.my_email import send_email
-from src.playlists.playlists import run_playlist_scrape, get_available_tracklisting_dates
-from src.watchlist import global_label_watchlist_df_list, concat_filter_process_label_watchlist_df
+from src.general_ranking.general_ranking import scrape_general_ranking, publish_general_ranking_scrape
+from src.history import history
+from src.instrumentation import instrumentation
+from src.language import get_title_languages
+from src.my_email import build_email, send_emails_in_background
+from src.playlists.playlists import scrape_playlists, publish_playlist_scrape
+from src.quota import quota_tracker
+from src.run_journal import get_run_journal
+from src.stages import Stage, run_stages, log_stage_timings
+from src.transport import circuit_breakers
+from src.watchlist import label_watchlist_collector, concat_filter_process_label_watchlist_df
 from src.charts.charts import get_uuid_toc_streams_for_songs_on_chart
 # Create a dictionary containing the credentials
 cronitor.api_key = cronitor_api_key
-cronitor.Monitor.put(
-    key="Jon-Song-Scrape",
-    type="job",
-)
 
 
-def send_daily_email(tuples, label_watchlist_df, aidan_only=False):
+def get_stage_metrics_message(stage_metrics: dict[str, dict]) -> str:
+    message = "\nStage costs:\n"
+    for name, metrics in stage_metrics.items():
+        message += (f"{name} -> {metrics['requests']} Soundcharts requests ({metrics['cache_hits']} cached), "
+                    f"{metrics['quota_consumed']} quota, {metrics['seconds']}s\n")
+    return message
+
+
+def send_daily_email(tuples, label_watchlist_df, stage_metrics=None, aidan_only=False):
     aidan_email = os.getenv("AIDAN_EMAIL")
     jon_email = os.getenv("JON_EMAIL")
     spreadsheet_url = os.getenv("SPREADSHEET_URL")
@@ -31,42 +42,90 @@ def send_daily_email(tuples, label_watchlist_df, aidan_only=False):
         message += f"Listen here: {spotify_url}\n"
 
     if label_watchlist_df is not None:
-        message += f"\nLabel Watchlist -> {len(label_watchlist_df)} songs"
+        message += f"\nLabel Watchlist -> {len(label_watchlist_df)} songs\n"
+
+    if stage_metrics:
+        message += get_stage_metrics_message(stage_metrics)
+
+    if quota_tracker.remaining is not None:
+        message += f"\nQuota remaining -> {quota_tracker.remaining}\n"
 
     today_date = str(pd.Timestamp.now().date())
     subject = f"SoundCharts Scrape {today_date}"
 
-    send_email(recipient=aidan_email,
-               subject=subject,
-               message=message,
-               attachment_paths=[])
+    recipients = [aidan_email] if aidan_only else [aidan_email, jon_email]
+    messages = [build_email(recipient=recipient, subject=subject, message=message, attachment_paths=[])
+                for recipient in recipients]
 
-    if not aidan_only:
-        send_email(recipient=jon_email,
-                   subject=subject,
-                   message=message,
-                   attachment_paths=[])
+    # Sent over one connection off the main thread, so the cron job finishes without waiting on SMTP
+    return send_emails_in_background(messages)
+
+
+def write_run_summary(stage_timings: dict[str, float]) -> None:
+    LOGS_FOLDER = os.getenv("LOGS_FOLDER")
+    today_date = str(pd.Timestamp.now().date())
+    instrumentation.write_summary(f"{LOGS_FOLDER}/run_summary_{today_date}.json",
+                                  extra={"stage_seconds": {name: round(seconds, 1)
+                                                           for name, seconds in stage_timings.items()},
+                                         **quota_tracker.summary(),
+                                         **circuit_breakers.summary()})
+    instrumentation.append_stage_metrics(f"{LOGS_FOLDER}/stage_metrics.jsonl")
+
+
+def get_scrape_stages() -> list[Stage]:
+    """
+    The fetch stages run concurrently. Publishing writes to the same spreadsheet and later scrapes drop songs that
+    were published by earlier ones, so the publish stages keep the original playlist, chart, general ranking order.
+    """
+    return [
+        Stage("playlist_fetch", lambda: scrape_playlists(input_lists.playlist_list), metrics_group="playlist"),
+        Stage("chart_fetch", lambda: scrape_all_charts(input_lists.platform_genre_country_chart_tuples),
+              main_thread=True, metrics_group="chart"),
+        Stage("general_ranking_fetch", lambda: scrape_general_ranking(on=False), metrics_group="general_ranking"),
+
+        Stage("playlist_publish", publish_playlist_scrape, inputs=["playlist_fetch"], metrics_group="playlist"),
+        Stage("chart_publish", publish_chart_scrape, inputs=["chart_fetch"], after=["playlist_publish"],
+              metrics_group="chart"),
+        Stage("general_ranking_publish", publish_general_ranking_scrape, inputs=["general_ranking_fetch"],
+              after=["chart_publish"], metrics_group="general_ranking"),
+
+        # The label watchlist is filled while songs are enriched by the fetch stages
+        Stage("label_watchlist", lambda: concat_filter_process_label_watchlist_df(label_watchlist_collector),
+              after=["playlist_fetch", "chart_fetch", "general_ranking_fetch"], metrics_group="watchlist"),
+    ]
 
 
 @cronitor.job("Jon-Song-Scrape")
 def run_all_scrapes() -> None:
-    playlist_sheet_name, playlist_df, playlist_spotify_url = run_playlist_scrape(input_lists.playlist_list)
-    chart_sheet_name, chart_df, chart_spotify_url = run_charts_scrape(input_lists.platform_genre_country_chart_tuples)
-    general_ranking_name, general_ranking_df, general_ranking_spotify_url = run_general_ranking_scrape(on=False)
-
-    label_watchlist_df = concat_filter_process_label_watchlist_df(global_label_watchlist_df_list)
+    # Restore the watchlist songs found before a crash earlier today, their songs are skipped by the scrapes
+    label_watchlist_collector.extend(get_run_journal().get_stage("label_watchlist"))
+
+    timings = {}
+    try:
+        results, timings = run_stages(get_scrape_stages())
+        log_stage_timings(timings)
+    finally:
+        write_run_summary(timings)
+        history.flush()
+        get_title_languages().save()
 
     scrape_name_df_playlist_tuples = [
-        (playlist_sheet_name, playlist_df, playlist_spotify_url),
-        (chart_sheet_name, chart_df, chart_spotify_url),
-        (general_ranking_name, general_ranking_df, general_ranking_spotify_url)
+        results["playlist_publish"],
+        results["chart_publish"],
+        results["general_ranking_publish"],
     ]
 
     scrape_name_df_playlist_tuples = [scrape for scrape in scrape_name_df_playlist_tuples if scrape[1] is not None]
 
-    send_daily_email(scrape_name_df_playlist_tuples, label_watchlist_df, aidan_only=False)
+    send_daily_email(scrape_name_df_playlist_tuples, results["label_watchlist"],
+                     stage_metrics=instrumentation.stage_summary(), aidan_only=False)
 
 
 if __name__ == "__main__":
+    # Registered here rather than at import so the runner can be imported without reaching cronitor
+    cronitor.Monitor.put(
+        key="Jon-Song-Scrape",
+        type="job",
+    )
     run_all_scrapes()
 
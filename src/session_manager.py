@@ -1,4 +1,52 @@
+import time
+
 import requests_cache
 import datetime
 
-session = requests_cache.CachedSession(expire_after=datetime.timedelta(hours=12))
\ No newline at end of file
+from src.fixtures import fixture_store, mount_fixture_adapter
+from src.instrumentation import instrumentation, get_endpoint_name
+from src.quota import quota_tracker
+from src.transport import TransportAdapter, CircuitOpenError
+
+
+class InstrumentedCachedSession(requests_cache.CachedSession):
+    """
+    Cached session recording the latency, size and cache status of every request, and the Soundcharts quota
+    remaining.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        endpoint = get_endpoint_name(method, url)
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except CircuitOpenError:
+            # Short circuited without a request being sent
+            raise
+        except Exception:
+            instrumentation.record(endpoint, time.perf_counter() - start, error=True)
+            raise
+
+        from_cache = getattr(response, "from_cache", False)
+        instrumentation.record(endpoint, time.perf_counter() - start,
+                               from_cache=from_cache,
+                               response_bytes=len(response.content),
+                               error=response.status_code >= 400)
+
+        # Cached responses carry the quota header from when they were stored
+        quota_remaining = response.headers.get("X-Quota-Remaining")
+        quota_consumed = 0
+        if not from_cache and quota_remaining and quota_remaining.isdigit():
+            quota_consumed = quota_tracker.update(int(quota_remaining))
+        instrumentation.record_soundcharts_response(from_cache, quota_consumed)
+        return response
+
+
+# Recorded runs use an in memory cache, so every response the run needs is recorded rather than read from an older
+# on disk cache, and replayed runs hit the cache in the same way
+session = InstrumentedCachedSession(expire_after=datetime.timedelta(hours=12),
+                                    backend="memory" if fixture_store else "sqlite")
+transport_adapter = TransportAdapter()
+session.mount("https://", transport_adapter)
+session.mount("http://", transport_adapter)
+mount_fixture_adapter(session)
@@ -1,58 +1,82 @@
+import json
 import os
+import threading
 import time
-from datetime import datetime
+from datetime import date, datetime
 
 import gspread
+import numpy as np
 import pandas as pd
 from gspread import Worksheet
+from gspread.utils import ValueInputOption, rowcol_to_a1
 from gspread_dataframe import get_as_dataframe, set_with_dataframe
 
 from src.charts.chart_utils import country_name_to_code_dict
+from src.fixtures import mount_fixture_adapter
+from src.instrumentation import instrumented
 from src.logging_config import logger
 from dotenv import load_dotenv
 from tqdm import tqdm
 load_dotenv()
 
+@instrumented("sheets")
 def get_spreadsheet_with_gspread(
         url: str = "https://docs.google.com/spreadsheets/d/1IqBH8AOOrKgo9OXiVzniHP3XFu24lbPGvWT2yf3M-a0/edit?gid=1885596214#gid=1885596214") -> gspread.Spreadsheet:
     credentials_filename = os.getenv("CREDENTIALS_FILENAME")
     authorized_user_filename = os.getenv("AUTHORIZED_USER_FILENAME")
     gc = gspread.oauth(credentials_filename=credentials_filename, authorized_user_filename=authorized_user_filename)
+    mount_fixture_adapter(gc.http_client.session)
     sheets_file = gc.open_by_url(url)
     print(f"Opened {sheets_file.title} with gspread")
 
     return sheets_file
 
 
-SPREADSHEET = get_spreadsheet_with_gspread()
+_spreadsheet: gspread.Spreadsheet | None = None
+_spreadsheet_lock = threading.Lock()
 
 
+def get_spreadsheet() -> gspread.Spreadsheet:
+    """
+    Open the spreadsheet on first use, so modules importing sheets_utils can be used without sheets access.
+    """
+    global _spreadsheet
+    with _spreadsheet_lock:
+        if _spreadsheet is None:
+            _spreadsheet = get_spreadsheet_with_gspread()
+    return _spreadsheet
+
+
+@instrumented("sheets")
 def get_inputs_worksheet_as_df() -> pd.DataFrame:
-    worksheet = SPREADSHEET.worksheet("inputs")
+    worksheet = get_spreadsheet().worksheet("inputs")
     df = get_as_dataframe(worksheet)
     df = swap_column_names_to_first_row(df)
     return df
 
 
+@instrumented("sheets")
 def order_worksheets_by_date():
-    scrape_worksheets = [worksheet for worksheet in SPREADSHEET.worksheets() if
+    spreadsheet = get_spreadsheet()
+    scrape_worksheets = [worksheet for worksheet in spreadsheet.worksheets() if
                          worksheet.title.startswith("chart_") or worksheet.title.startswith("playlist_")
                          or worksheet.title.startswith("general_")]
 
-    notes = SPREADSHEET.worksheet("notes")
-    inputs = SPREADSHEET.worksheet("inputs")
-    label_watchlist = SPREADSHEET.worksheet("label_watchlist")
+    notes = spreadsheet.worksheet("notes")
+    inputs = spreadsheet.worksheet("inputs")
+    label_watchlist = spreadsheet.worksheet("label_watchlist")
 
     sorted_worksheets = sorted(scrape_worksheets,
                                key=lambda x: datetime.strptime(x.title.split('_')[1], "%Y-%m-%d"), reverse=True)
 
     reordered_sheets = [notes, inputs, label_watchlist] + sorted_worksheets
-    SPREADSHEET.reorder_worksheets(reordered_sheets)
+    spreadsheet.reorder_worksheets(reordered_sheets)
     logger.info("Reordered worksheets by date")
 
 
+@instrumented("sheets")
 def get_all_chart_and_playlist_worksheets_as_df() -> list[pd.DataFrame]:
-    worksheets = SPREADSHEET.worksheets()
+    worksheets = get_spreadsheet().worksheets()
 
     # Filter out the chart and playlist worksheets
     result = []
@@ -90,47 +114,170 @@ def check_uuid_appearances(uuid: str, sets_of_uuids: list[set[str]]) -> int:
     for _set in sets_of_uuids:
         if uuid in _set:
             appearances += 1
-            logger.debug(f"Found {uuid} in past appearance up to {appearances}")
+            logger.debug(f"Found {uuid} in past appearance up to {appearances}", extra={"per_song": True})
 
     return appearances
 
 
+@instrumented("sheets")
 def create_and_set_new_worksheet_to_df(title: str, df: pd.DataFrame) -> Worksheet:
-    worksheets = SPREADSHEET.worksheets()
+    spreadsheet = get_spreadsheet()
+    worksheets = spreadsheet.worksheets()
 
     # Check if the worksheet already exists
     worksheet_titles = [worksheet.title for worksheet in worksheets]
 
     if title not in worksheet_titles:
-        SPREADSHEET.add_worksheet(title=title, rows=10, cols=10)
+        spreadsheet.add_worksheet(title=title, rows=10, cols=10)
         logger.info(f"Created new worksheet: {title}")
 
-    worksheet = SPREADSHEET.worksheet(title)
+    worksheet = spreadsheet.worksheet(title)
     set_with_dataframe(worksheet, df, resize=True)
     logger.info(f"Set worksheet: {title}")
     return worksheet
 
 
-def get_watchlist_sheet_as_df_and_concat(watchlist_df_to_concat: pd.DataFrame,
-                                         title: str = "label_watchlist") -> pd.DataFrame:
-    worksheet = SPREADSHEET.worksheet(title)
-    df = get_as_dataframe(worksheet)
+WATCHLIST_RECONCILE_DAYS = 7
+
+
+def load_watchlist_mirror(mirror_path: str) -> dict | None:
+    if not os.path.exists(mirror_path):
+        return None
+    try:
+        with open(mirror_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Failed to load watchlist mirror {mirror_path}: {e}")
+        return None
+
+
+def save_watchlist_mirror(mirror_path: str, mirror: dict) -> None:
+    tmp_path = f"{mirror_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(mirror, f)
+    os.replace(tmp_path, mirror_path)
+
+
+def reconcile_watchlist_mirror(worksheet: Worksheet) -> dict:
+    """
+    Read the header and the song_uuid column from the worksheet, picking up any rows edited by hand.
+    """
+    header = worksheet.row_values(1)
+    uuids = worksheet.col_values(header.index("song_uuid") + 1)[1:] if "song_uuid" in header else []
+    logger.info(f"Reconciled watchlist mirror with {len(uuids)} songs on worksheet {worksheet.title}")
+    return {"header": header, "uuids": uuids, "reconciled_at": datetime.now().isoformat()}
+
+
+def watchlist_mirror_is_stale(mirror: dict | None) -> bool:
+    if mirror is None:
+        return True
+    reconciled_at = datetime.fromisoformat(mirror["reconciled_at"])
+    return (datetime.now() - reconciled_at).days >= WATCHLIST_RECONCILE_DAYS
+
+
+@instrumented("sheets")
+def append_new_songs_to_watchlist_worksheet(watchlist_df: pd.DataFrame, mirror_path: str,
+                                            title: str = "label_watchlist") -> pd.DataFrame:
+    """
+    Append the songs that are not on the watchlist worksheet yet and return them.
+
+    The uuids already on the worksheet are kept in a local mirror, so only the new rows are sent. The mirror is
+    reconciled with the worksheet when it is missing or older than WATCHLIST_RECONCILE_DAYS.
+    """
+    worksheet = get_spreadsheet().worksheet(title)
+
+    mirror = load_watchlist_mirror(mirror_path)
+    if watchlist_mirror_is_stale(mirror):
+        mirror = reconcile_watchlist_mirror(worksheet)
+        save_watchlist_mirror(mirror_path, mirror)
+
+    known_uuids = set(mirror["uuids"])
+    new_songs_df = watchlist_df[~watchlist_df["song_uuid"].isin(known_uuids)].drop_duplicates("song_uuid")
+    if new_songs_df.empty:
+        return new_songs_df
 
-    worksheet_watchlist_uuids = set(df["song_uuid"].to_list())
-    new_watchlist_uuids = set(watchlist_df_to_concat["song_uuid"].to_list())
-    new_watchlist_uuids = new_watchlist_uuids - worksheet_watchlist_uuids
+    if not mirror["header"]:
+        mirror["header"] = [str(column) for column in new_songs_df.columns]
+        worksheet.append_rows([mirror["header"]])
 
-    # Add the new watchlist songs to the worksheet
-    if watchlist_df_to_concat is not None:
-        watchlist_df_to_concat = watchlist_df_to_concat[watchlist_df_to_concat["song_uuid"].isin(new_watchlist_uuids)]
-        df = pd.concat([df, watchlist_df_to_concat], ignore_index=True)
+    # Match the column order of the worksheet, columns only on the worksheet are left blank
+    rows = dataframe_to_sheet_rows(new_songs_df.reindex(columns=mirror["header"]))
+    rows = [[value.isoformat() if isinstance(value, (date, datetime)) else value for value in row] for row in rows]
+    worksheet.append_rows(rows, value_input_option=ValueInputOption.user_entered)
 
-    # Set the new concatenated df to the worksheet
-    set_with_dataframe(worksheet, df)
+    mirror["uuids"] += new_songs_df["song_uuid"].to_list()
+    save_watchlist_mirror(mirror_path, mirror)
+    logger.info(f"Appended {len(new_songs_df)} songs to worksheet {title}")
 
-    return watchlist_df_to_concat
+    return new_songs_df
+
+
+def dataframe_to_sheet_rows(df: pd.DataFrame) -> list[list]:
+    """
+    Convert a dataframe to a list of rows that can be sent to the sheets api, with NaN values left blank.
+    """
+    df = df.astype(object).where(pd.notna(df), "")
+    return df.values.tolist()
 
 
+def worksheet_matches_published_dataframe(worksheet: Worksheet, published_df: pd.DataFrame) -> bool:
+    """
+    Cheap check that the worksheet still holds the published dataframe, comparing the header and the number of rows.
+    """
+    header = [published_df.index.name or ""] + [str(column) for column in published_df.columns]
+    if worksheet.row_values(1) != header:
+        return False
+
+    return len(worksheet.col_values(1)) == len(published_df) + 1
+
+
+@instrumented("sheets")
+def set_dataframe_on_worksheet_incrementally(worksheet: Worksheet, df: pd.DataFrame, mirror_path: str) -> None:
+    """
+    Set a numeric dataframe with a sorted index on a worksheet, appending only the rows for new index values and
+    rewriting only the columns whose published values changed.
+
+    A copy of the last published dataframe is kept at mirror_path to work out the changes. If it is missing, the
+    columns changed or the worksheet no longer matches it, the whole dataframe is rewritten.
+    """
+    published_df = pd.read_pickle(mirror_path) if os.path.exists(mirror_path) else None
+
+    if (published_df is None
+            or not published_df.columns.equals(df.columns)
+            or not df.index[:len(published_df)].equals(published_df.index)
+            or not worksheet_matches_published_dataframe(worksheet, published_df)):
+        set_with_dataframe(worksheet, df, resize=True, include_index=True)
+        df.to_pickle(mirror_path)
+        logger.info(f"Rewrote worksheet {worksheet.title} with {len(df)} rows")
+        return
+
+    published_rows = len(published_df)
+    published_values = published_df.to_numpy(dtype=float)
+    new_values = df.iloc[:published_rows].to_numpy(dtype=float)
+    changed_columns = np.flatnonzero(~np.isclose(published_values, new_values, equal_nan=True).all(axis=0))
+
+    # Rewrite the changed columns for the rows that were already published, offset by the index column
+    column_updates = []
+    for column_position in changed_columns:
+        column_number = int(column_position) + 2
+        column_range = f"{rowcol_to_a1(2, column_number)}:{rowcol_to_a1(published_rows + 1, column_number)}"
+        column_values = dataframe_to_sheet_rows(df.iloc[:published_rows, [column_position]])
+        column_updates.append({"range": column_range, "values": column_values})
+
+    if column_updates:
+        worksheet.batch_update(column_updates, value_input_option=ValueInputOption.user_entered)
+
+    new_rows_df = df.iloc[published_rows:]
+    if not new_rows_df.empty:
+        worksheet.append_rows(dataframe_to_sheet_rows(new_rows_df.reset_index()),
+                              value_input_option=ValueInputOption.user_entered)
+
+    df.to_pickle(mirror_path)
+    logger.info(f"Updated worksheet {worksheet.title}: appended {len(new_rows_df)} rows, "
+                f"rewrote {len(column_updates)} changed columns")
+
+
+@instrumented("sheets")
 def add_spotify_playlist_link_at_top_of_worksheet(playlist_url: str, worksheet: Worksheet) -> None:
     worksheet.insert_row(["Spotify Playlist", playlist_url], 1)
     logger.info(f"Inserted playlist URL at top of worksheet: {playlist_url}")
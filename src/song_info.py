@@ -10,14 +10,18 @@ from src import input_lists
 from src.credentials_key_info import BASE_API_URL, credentials
 from src.filters import get_three_day_average_from_stream_df, get_last_week_3_day_avg, \
     get_increase_between_avg, get_today_streams, get_yesterday_streams, get_14_day_daily_max_median, get_total_streams, \
-    signed_to_banned_label, x_percent_of_streams_are_from_one_day_in_last_14_days, is_english, \
+    signed_to_banned_label, x_percent_of_streams_are_from_one_day_in_last_14_days, non_instrumental_non_english, \
     signed_to_watchlist_label, get_last_week_7_day_avg, get_this_week_7_day_avg
+from src.history import history
 from src.logging_config import logger
+from src.run_journal import get_run_journal
 from src.session_manager import session
+from src.transport import CircuitOpenError
 from src.utils import extract_label_list_from_song_metadata, get_artist_names_and_main_artist_uuid, \
     get_instrumentalness_from_song_metadata, get_root_genres_from_song_metadata, get_sub_genres_from_song_metadata, \
-    get_remaining_api_quota_from_headers_and_update_remaining_quota, banned_artist, get_uuid_from_url
-from src.watchlist import global_label_watchlist_df_list
+    banned_artist, get_uuid_from_url
+from src.song_records import SongMetadata, SongMetrics, SongInfo
+from src.watchlist import label_watchlist_collector
 
 
 def get_song_metadata(uuid: str) -> SimpleNamespace:
@@ -34,10 +38,13 @@ def get_song_metadata(uuid: str) -> SimpleNamespace:
 
         data: SimpleNamespace = SimpleNamespace(**rj["object"])
 
-        get_remaining_api_quota_from_headers_and_update_remaining_quota(response)
-
         return data
-    except:
+    except CircuitOpenError:
+        logger.debug(f"Skipping metadata of song {uuid} while its endpoint is failing", extra={"per_song": True})
+        return None
+    except requests.RequestException:
+        raise
+    except Exception:
         return None
 
 
@@ -50,6 +57,10 @@ def get_artist_follower_count_from_uuid(uuid: str, platform: str):
         main_artist = items[0]
         follower_count = main_artist["followerCount"]
         return follower_count
+    except CircuitOpenError:
+        return np.nan
+    except requests.RequestException:
+        raise
     except Exception:
         logger.debug("Failed getting artist follower count from uuid")
         return np.nan
@@ -73,6 +84,13 @@ def get_spotify_followers_monthly_listeners_conversion_rate(artist_uuid: str):
         logger.debug("artist has no spotify followers_monthly listeners and conversion rate data")
         return np.nan, np.nan, np.nan
 
+    except CircuitOpenError:
+        # Optional metrics, left empty while the endpoint is failing
+        return np.nan, np.nan, np.nan
+
+    except requests.RequestException:
+        raise
+
     except Exception as e:
         # logger.error(f"Failed getting artist spotify followers_monthly listeners and conversion rate {e}")
         return np.nan, np.nan, np.nan
@@ -152,7 +170,7 @@ def get_song_audience(uuid, platform, start_date=None, end_date=None):
 
     response = session.get(url, headers=credentials)
     if response.status_code != 200:
-        logger.debug(f"Song {uuid} has no audience metrics")
+        logger.debug(f"Song {uuid} has no audience metrics", extra={"per_song": True})
         return pd.DataFrame()
 
     stream_data_df = get_stream_df_from_response(response)
@@ -215,51 +233,44 @@ def in_song_blocklist(uuid: str) -> bool:
     return False
 
 
-def failed_artist_label_english_filters(song_uuid, song_metadata):
+def failed_artist_label_english_filters(song_uuid, song_metadata) -> str | None:
+    """
+    Get the name of the first metadata filter the song fails, or None if it passes them all.
+    """
     # Get info from the song metadata
     song_label_list = extract_label_list_from_song_metadata(song_metadata)
     artist_names, main_artist_uuid = get_artist_names_and_main_artist_uuid(song_metadata)
     instrumentalness = get_instrumentalness_from_song_metadata(song_metadata)
 
     if signed_to_watchlist_label(song_label_list):
-        song_metadata_df: pd.DataFrame = extract_metadata_to_df(song_metadata)
-        song_audience_df: pd.DataFrame = get_song_audience(song_uuid, "spotify")
-        metrics_df: pd.DataFrame = get_metrics_df(song_audience_df, song_uuid)
-        result_df: pd.DataFrame = pd.concat([song_metadata_df, metrics_df], axis=1)
-
-        global_label_watchlist_df_list.append(result_df)
-        logger.debug(f"Song {song_uuid} added to watchlist label df")
-        return True
+        return "label_watchlist"
 
     if in_song_blocklist(song_uuid):
-        logger.debug(f"Song {song_uuid} is in the song blocklist, skipping")
-        return True
+        logger.debug(f"Song {song_uuid} is in the song blocklist, skipping", extra={"per_song": True})
+        return "song_blocklist"
 
     # Check if song has more than 1 artist
     if len(artist_names) > input_lists.max_artists_on_track:
-        logger.debug(f"Song {song_uuid} has more than {input_lists.max_artists_on_track} artists, skipping")
-        return True
+        logger.debug(f"Song {song_uuid} has more than {input_lists.max_artists_on_track} artists, skipping",
+                     extra={"per_song": True})
+        return "max_artists_on_track"
 
     if signed_to_banned_label(song_label_list):
-        logger.debug(f"Song {song_uuid} is signed to banned label, skipping")
-        return True
+        logger.debug(f"Song {song_uuid} is signed to banned label, skipping", extra={"per_song": True})
+        return "label_blocklist"
 
     if banned_artist(artist_names[0]):
-        logger.debug(f"Song {song_uuid} is by a banned artist, skipping")
-        return True
-
-    # if non_instrumental_non_english(song_metadata, instrumentalness):
-    #     logger.debug(f"Song {song_uuid} is non-english non-instrumental, skipping")
-    #     return True
+        logger.debug(f"Song {song_uuid} is by a banned artist, skipping", extra={"per_song": True})
+        return "artist_blocklist"
 
-    if not is_english(song_metadata.name):
-        logger.debug(f"Song {song_uuid} is not in English, skipping")
-        return True
+    if non_instrumental_non_english(song_metadata, instrumentalness):
+        logger.debug(f"Song {song_uuid} is non-english non-instrumental, skipping", extra={"per_song": True})
+        return "non_instrumental_non_english"
 
-    return False
+    return None
 
 
-def extract_metadata_to_df(song_metadata) -> pd.DataFrame:
+def get_song_metadata_record(song_metadata) -> SongMetadata:
     # Get info from the song metadata
     song_label_list = extract_label_list_from_song_metadata(song_metadata)
     artist_names, main_artist_uuid = get_artist_names_and_main_artist_uuid(song_metadata)
@@ -267,34 +278,33 @@ def extract_metadata_to_df(song_metadata) -> pd.DataFrame:
 
     followers, listeners, conversion_rate = get_spotify_followers_monthly_listeners_conversion_rate(main_artist_uuid)
 
-    metadata_dict = {
-        "song_uuid": song_metadata.uuid,
-        "song_name": song_metadata.name,
-        "url": song_metadata.appUrl.replace("overview", "trends"),
-        "labels": ", ".join(song_label_list),
-        "artists": ", ".join(artist_names),
-        "main_artist": artist_names[0],
-        "main_artist_uuid": main_artist_uuid,
-        "main_artist_spotify_followers": followers,
-        "main_artist_spotify_monthly_listeners": listeners,
-        "main_artist_spotify_conversion_rate": conversion_rate,
-        "instrumentalness": instrumentalness,
-        "root_genres": get_root_genres_from_song_metadata(song_metadata),
-        "sub_genres": get_sub_genres_from_song_metadata(song_metadata),
-        "release_date": song_metadata.releaseDate.split("T")[0],
-        "duration": song_metadata.duration,
-    }
+    return SongMetadata(
+        song_uuid=song_metadata.uuid,
+        song_name=song_metadata.name,
+        url=song_metadata.appUrl.replace("overview", "trends"),
+        labels=", ".join(song_label_list),
+        artists=", ".join(artist_names),
+        main_artist=artist_names[0],
+        main_artist_uuid=main_artist_uuid,
+        main_artist_spotify_followers=followers,
+        main_artist_spotify_monthly_listeners=listeners,
+        main_artist_spotify_conversion_rate=conversion_rate,
+        instrumentalness=instrumentalness,
+        root_genres=get_root_genres_from_song_metadata(song_metadata),
+        sub_genres=get_sub_genres_from_song_metadata(song_metadata),
+        release_date=song_metadata.releaseDate.split("T")[0],
+        duration=song_metadata.duration,
+    )
 
-    metadata_df = pd.DataFrame(metadata_dict, index=[0])
-    return metadata_df
 
+def extract_metadata_to_df(song_metadata) -> pd.DataFrame:
+    return pd.DataFrame([get_song_metadata_record(song_metadata).as_row()])
 
-def get_metrics_df(song_audience_df: pd.DataFrame, song_uuid: str) -> pd.DataFrame:
+
+def get_song_metrics(song_audience_df: pd.DataFrame, song_uuid: str) -> SongMetrics:
     if song_audience_df.empty:
-        logger.debug(f"Song {song_uuid} has no stream data, leaving with empty metrics")
-        return pd.DataFrame(
-            columns=["today_streams", "yesterday_streams", "day_1-3_average", "day_7-9_average", "%_increase",
-                     "14_day_max", "14_day_median", "total_streams"])
+        logger.debug(f"Song {song_uuid} has no stream data, leaving with empty metrics", extra={"per_song": True})
+        return SongMetrics()
 
     # Three day averages
     three_day_average: int = get_three_day_average_from_stream_df(song_audience_df)
@@ -321,47 +331,117 @@ def get_metrics_df(song_audience_df: pd.DataFrame, song_uuid: str) -> pd.DataFra
     # Total streams
     total_streams = get_total_streams(song_audience_df)
 
-    # Create a dataframe with the metrics
-    df = pd.DataFrame(
-        {
-            "today_streams": [round(today_streams, 2)],
-            "yesterday_streams": [round(yesterday_streams, 2)],
-
-            # Just used for general ranking
-            "this_week_7_day_average": [round(this_week_seven_day_average, 2)],
-            "last_week_7_day_average": [round(last_week_seven_day_average, 2)],
-            "week_to_week_percentage_increase": [round(week_to_week_percentage_increase, 2)],
-
-            "day_1-3_average": [round(three_day_average, 2)],
-            "day_7-9_average": [round(last_week_3_day_avg, 2)],
-            "%_increase": [round(increase_between_avg, 2)],
-            "14_day_max": [round(fourteen_day_max, 2)],
-            "14_day_median": [round(fourteen_day_median, 2)],
-            "total_streams": [total_streams],
-        }
+    return SongMetrics(
+        today_streams=round(today_streams, 2),
+        yesterday_streams=round(yesterday_streams, 2),
+        this_week_7_day_average=round(this_week_seven_day_average, 2),
+        last_week_7_day_average=round(last_week_seven_day_average, 2),
+        week_to_week_percentage_increase=round(week_to_week_percentage_increase, 2),
+        day_1_3_average=round(three_day_average, 2),
+        day_7_9_average=round(last_week_3_day_avg, 2),
+        percent_increase=round(increase_between_avg, 2),
+        fourteen_day_max=round(fourteen_day_max, 2),
+        fourteen_day_median=round(fourteen_day_median, 2),
+        total_streams=total_streams,
     )
-    return df
 
 
-def get_all_song_info(song_uuid) -> pd.DataFrame:
+def get_metrics_df(song_audience_df: pd.DataFrame, song_uuid: str) -> pd.DataFrame:
+    if song_audience_df.empty:
+        return pd.DataFrame(
+            columns=["today_streams", "yesterday_streams", "day_1-3_average", "day_7-9_average", "%_increase",
+                     "14_day_max", "14_day_median", "total_streams"])
+
+    return pd.DataFrame([get_song_metrics(song_audience_df, song_uuid).as_row()])
+
+
+def get_rejected_candidate_row(song_uuid, song_metadata) -> dict:
+    """
+    The metadata already fetched for a song rejected before enrichment, without the extra artist requests.
+    """
+    artist_names, main_artist_uuid = get_artist_names_and_main_artist_uuid(song_metadata)
+    return {
+        "song_uuid": song_uuid,
+        "song_name": song_metadata.name,
+        "labels": ", ".join(extract_label_list_from_song_metadata(song_metadata)),
+        "main_artist": artist_names[0],
+        "main_artist_uuid": main_artist_uuid,
+    }
+
+
+def collect_watchlist_song(song_uuid, song_metadata) -> None:
+    """
+    Enrich a watchlist label song from the metadata already fetched, once per run however many charts or playlists
+    it appears on. The artist retention is only fetched for songs the watchlist stream filter would keep.
+    """
+    if not label_watchlist_collector.claim(song_uuid):
+        return
+
+    try:
+        song_audience_df: pd.DataFrame = get_song_audience(song_uuid, "spotify")
+        song_metrics = get_song_metrics(song_audience_df, song_uuid)
+        if song_metrics.total_streams > input_lists.max_streams:
+            # Dropped by the watchlist filters whatever the artist's followers, the claim stays so it is not refetched
+            logger.debug(f"Watchlist song {song_uuid} has more than {input_lists.max_streams} streams, skipping",
+                         extra={"per_song": True})
+            rows = []
+        else:
+            rows = [SongInfo(get_song_metadata_record(song_metadata), song_metrics).as_row()]
+    except Exception:
+        label_watchlist_collector.release(song_uuid)
+        raise
+
+    get_run_journal().record("label_watchlist", song_uuid, rows)
+    if rows:
+        label_watchlist_collector.add(song_uuid, rows[0])
+        logger.debug(f"Song {song_uuid} added to watchlist label df", extra={"per_song": True})
+
+
+def get_song_info(song_uuid, source: str | None = None) -> SongInfo | None:
+    """
+    Get the metadata and stream metrics of the song, or None if it has no metadata or fails the filters. With a
+    source the candidate and its verdict are recorded in the history warehouse.
+    """
     song_metadata = get_song_metadata(song_uuid)
 
     if not song_metadata:
-        return pd.DataFrame()
+        return None
 
-    if failed_artist_label_english_filters(song_uuid, song_metadata):
-        return pd.DataFrame()
+    failed_filter = failed_artist_label_english_filters(song_uuid, song_metadata)
+    if failed_filter == "label_watchlist":
+        collect_watchlist_song(song_uuid, song_metadata)
 
-    song_metadata_df: pd.DataFrame = extract_metadata_to_df(song_metadata)
+    if failed_filter:
+        if source:
+            history.record_candidate(get_rejected_candidate_row(song_uuid, song_metadata), source, failed_filter)
+        return None
+
+    song_metadata_record = get_song_metadata_record(song_metadata)
     song_audience_df = get_song_audience(song_uuid, "spotify")
 
     if not song_audience_df.empty and x_percent_of_streams_are_from_one_day_in_last_14_days(song_audience_df,
                                                                                             input_lists.max_percent_of_streams_on_one_day):
         logger.debug(
-            f"Song {song_uuid} has < {input_lists.max_percent_of_streams_on_one_day} of streams from one day, skipping")
-        return pd.DataFrame()
+            f"Song {song_uuid} has < {input_lists.max_percent_of_streams_on_one_day} of streams from one day, skipping",
+            extra={"per_song": True})
+        if source:
+            history.record_candidate(song_metadata_record.as_row(), source, "max_percent_of_streams_on_one_day")
+        return None
+
+    song_info = SongInfo(song_metadata_record, get_song_metrics(song_audience_df, song_uuid))
+    if source:
+        # Updated by the follower and stream filters once the stage has all its songs
+        history.record_candidate(song_info.as_row(), source, "enriched")
+    return song_info
+
+
+def get_song_info_rows(song_uuid, source: str | None = None) -> list[dict]:
+    """
+    The song as a list of at most one row, empty if the song was skipped.
+    """
+    song_info = get_song_info(song_uuid, source)
+    return [song_info.as_row()] if song_info else []
 
-    metrics_df = get_metrics_df(song_audience_df, song_uuid)
-    result_df = pd.concat([song_metadata_df, metrics_df], axis=1)
 
-    return result_df
+def get_all_song_info(song_uuid, source: str | None = None) -> pd.DataFrame:
+    return pd.DataFrame(get_song_info_rows(song_uuid, source))
@@ -0,0 +1,103 @@
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(slots=True)
+class SongMetadata:
+    song_uuid: str
+    song_name: str
+    url: str
+    labels: str
+    artists: str
+    main_artist: str
+    main_artist_uuid: str
+    main_artist_spotify_followers: float
+    main_artist_spotify_monthly_listeners: float
+    main_artist_spotify_conversion_rate: float
+    instrumentalness: float | str
+    root_genres: str
+    sub_genres: str
+    release_date: str
+    duration: int | str
+
+    def as_row(self) -> dict:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+@dataclass(slots=True)
+class SongMetrics:
+    today_streams: float = np.nan
+    yesterday_streams: float = np.nan
+
+    # Just used for general ranking
+    this_week_7_day_average: float = np.nan
+    last_week_7_day_average: float = np.nan
+    week_to_week_percentage_increase: float = np.nan
+
+    day_1_3_average: float = np.nan
+    day_7_9_average: float = np.nan
+    percent_increase: float = np.nan
+    fourteen_day_max: float = np.nan
+    fourteen_day_median: float = np.nan
+    total_streams: float = np.nan
+
+    def as_row(self) -> dict:
+        return {
+            "today_streams": self.today_streams,
+            "yesterday_streams": self.yesterday_streams,
+            "this_week_7_day_average": self.this_week_7_day_average,
+            "last_week_7_day_average": self.last_week_7_day_average,
+            "week_to_week_percentage_increase": self.week_to_week_percentage_increase,
+            "day_1-3_average": self.day_1_3_average,
+            "day_7-9_average": self.day_7_9_average,
+            "%_increase": self.percent_increase,
+            "14_day_max": self.fourteen_day_max,
+            "14_day_median": self.fourteen_day_median,
+            "total_streams": self.total_streams,
+        }
+
+
+@dataclass(slots=True)
+class SongInfo:
+    metadata: SongMetadata
+    metrics: SongMetrics
+
+    def as_row(self) -> dict:
+        row = self.metadata.as_row()
+        row.update(self.metrics.as_row())
+        return row
+
+
+class SongRowBuffer:
+    """
+    Column oriented buffer of song rows, so a stage builds its DataFrame once instead of concatenating a DataFrame
+    per song. Rows may have different keys, missing values are filled with NaN. Not thread safe, append from the
+    thread collecting the results.
+    """
+
+    def __init__(self):
+        self.columns: dict[str, list] = {}
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, row: dict) -> None:
+        for column, value in row.items():
+            if column not in self.columns:
+                self.columns[column] = [np.nan] * self.length
+            self.columns[column].append(value)
+
+        self.length += 1
+        for values in self.columns.values():
+            if len(values) < self.length:
+                values.append(np.nan)
+
+    def extend(self, rows: list[dict]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
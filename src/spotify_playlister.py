@@ -7,6 +7,8 @@ from more_itertools import chunked as batched
 from spotipy.oauth2 import SpotifyOAuth
 
 from src.credentials_key_info import BASE_API_URL, credentials
+from src.fixtures import mount_fixture_adapter
+from src.instrumentation import instrumented
 from src.logging_config import logger
 from src.session_manager import session
 from src.utils import get_uuid_from_url
@@ -24,8 +26,10 @@ class DefaultSpotipy:
                                                    client_secret=client_secret,
                                                    redirect_uri=redirect_uri,
                                                    scope=scope))
+    mount_fixture_adapter(sp._session)
 
 
+@instrumented("spotify")
 def create_playlist(name):
     sp = DefaultSpotipy().sp
     playlist = sp.user_playlist_create(user=user_id, name=name)
@@ -34,6 +38,7 @@ def create_playlist(name):
     return playlist_id
 
 
+@instrumented("spotify")
 def add_to_playlist(playlist_id, tracks: list[str]):
     if not tracks:
         return
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from src.history import history
+from src.instrumentation import instrumentation
+from src.logging_config import logger
+
+
+@dataclass
+class Stage:
+    """
+    A named step of a run.
+
+    func is called with the results of the stages in inputs as positional arguments, once those stages and the
+    stages in after have finished. Stages with main_thread set run on the calling thread, for work that relies on
+    signals such as the timeout decorator. The requests and time of the stage are accounted to metrics_group.
+    """
+    name: str
+    func: Callable[..., Any]
+    inputs: list[str] = field(default_factory=list)
+    after: list[str] = field(default_factory=list)
+    main_thread: bool = False
+    metrics_group: str | None = None
+
+    @property
+    def dependencies(self) -> list[str]:
+        return self.inputs + self.after
+
+
+def run_stage(stage: Stage, args: list[Any]) -> tuple[Any, float]:
+    logger.info(f"Starting stage {stage.name}")
+    start = time.perf_counter()
+    try:
+        with instrumentation.stage(stage.metrics_group or stage.name):
+            result = stage.func(*args)
+    except Exception as e:
+        logger.error(f"Stage {stage.name} failed after {time.perf_counter() - start:.1f}s: {e}")
+        raise
+    finally:
+        # The candidates of a finished stage are written even if a later stage crashes the run
+        history.flush()
+
+    seconds = time.perf_counter() - start
+    logger.info(f"Finished stage {stage.name} in {seconds:.1f}s")
+    return result, seconds
+
+
+def run_stages(stages: list[Stage], max_workers: int = 4) -> tuple[dict[str, Any], dict[str, float]]:
+    """
+    Run the stages as a DAG, starting each stage as soon as all of its dependencies have finished so independent
+    stages run concurrently.
+
+    Returns:
+        The result and the wall time in seconds of every stage, keyed by stage name
+    """
+    stage_names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = set(stage.dependencies) - stage_names
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {unknown}")
+
+    results: dict[str, Any] = {}
+    timings: dict[str, float] = {}
+    pending: dict[str, Stage] = {stage.name: stage for stage in stages}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            ready = [stage for stage in pending.values() if all(name in results for name in stage.dependencies)]
+            for stage in ready:
+                del pending[stage.name]
+
+            for stage in ready:
+                if not stage.main_thread:
+                    args = [results[name] for name in stage.inputs]
+                    running[executor.submit(run_stage, stage, args)] = stage
+
+            main_thread_stages = [stage for stage in ready if stage.main_thread]
+            for stage in main_thread_stages:
+                args = [results[name] for name in stage.inputs]
+                results[stage.name], timings[stage.name] = run_stage(stage, args)
+
+            if main_thread_stages:
+                continue
+
+            if not running:
+                raise ValueError(f"Stages {list(pending)} have circular dependencies")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                results[stage.name], timings[stage.name] = future.result()
+
+    return results, timings
+
+
+def log_stage_timings(timings: dict[str, float]) -> None:
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        logger.info(f"Stage {name}: {seconds:.1f}s")
@@ -0,0 +1,374 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid as uuid_lib
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from src.logging_config import logger
+
+# All data is generated deterministically from the uuids and dates in the request, so repeated runs see the same songs
+STUB_NAMESPACE = uuid_lib.UUID("5a0c6f0e-4f3b-4d2a-9a57-3c1f0e8b7d21")
+LABEL_NAMES = ["Independent", "Stub Records", "Synthetic Sounds", "Nowhere Music", "Placeholder Label"]
+GENRES = [("pop", ["dance pop", "electropop"]), ("hip hop", ["trap", "drill"]), ("rock", ["indie rock"]),
+          ("electronic", ["house", "techno"]), ("latin", ["reggaeton"])]
+CHART_GENRES = ["top-200", "viral-50", "pop", "alternative", "hip-hop", "dance"]
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.05
+    latency_jitter: float = 0.02
+    # Requests allowed per second before answering 429, 0 to disable
+    rate_limit: int = 0
+    quota: int = 1_000_000
+    # Share of requests answered with a 500 error
+    failure_rate: float = 0.0
+    chart_size: int = 200
+    playlist_size: int = 150
+    playlist_daily_additions: int = 5
+    ranking_size: int = 1000
+    related_artists: int = 20
+
+
+def get_uuid(kind: str, key) -> str:
+    return str(uuid_lib.uuid5(STUB_NAMESPACE, f"{kind}-{key}"))
+
+
+def get_rng(*keys) -> random.Random:
+    seed = hashlib.sha1("-".join(str(key) for key in keys).encode("utf-8")).hexdigest()
+    return random.Random(seed)
+
+
+def to_datetime_string(day: date) -> str:
+    return f"{day.isoformat()}T00:00:00+00:00"
+
+
+def parse_day(value: str | None, default: date) -> date:
+    if not value:
+        return default
+    return date.fromisoformat(value[:10])
+
+
+class StubState:
+    """
+    Quota and rate limit counters shared by all the handler threads.
+    """
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.quota_remaining = config.quota
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.requests = 0
+
+    def admit(self) -> tuple[int, int]:
+        """
+        Returns the status code to answer with and the remaining quota.
+        """
+        with self.lock:
+            self.requests += 1
+
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start, self.window_requests = now, 0
+            self.window_requests += 1
+
+            if self.config.rate_limit and self.window_requests > self.config.rate_limit:
+                return 429, self.quota_remaining
+
+            if self.quota_remaining <= 0:
+                return 429, 0
+
+            self.quota_remaining -= 1
+            return 200, self.quota_remaining
+
+
+def paginate(path: str, query: dict[str, str], items: list, default_limit: int = 100) -> dict:
+    offset = int(query.get("offset", 0))
+    limit = int(query.get("limit", default_limit))
+    next_url = None
+    if offset + limit < len(items):
+        next_url = "/api" + path + "?" + urlencode({**query, "offset": offset + limit, "limit": limit})
+
+    return {
+        "items": items[offset:offset + limit],
+        "page": {"offset": offset, "limit": limit, "total": len(items), "next": next_url, "previous": None},
+    }
+
+
+def get_song_object(song_uuid: str) -> dict:
+    rng = get_rng("song", song_uuid)
+    artist_count = rng.choice([1, 1, 1, 2, 3])
+    root, subs = rng.choice(GENRES)
+    release_date = date.today() - timedelta(days=rng.randint(1, 720))
+    name = rng.choice(["Night", "Summer", "Golden", "Lost", "Echo", "Café", "Corazón"]) + f" {rng.randint(1, 999)}"
+
+    return {
+        "uuid": song_uuid,
+        "name": name,
+        "isrc": {"value": f"STUB{rng.randint(10 ** 7, 10 ** 8 - 1)}"},
+        "creditName": f"Artist {song_uuid[:6]}",
+        "appUrl": f"https://app.soundcharts.com/app/song/{song_uuid}/overview",
+        "imageUrl": None,
+        "releaseDate": to_datetime_string(release_date),
+        "duration": rng.randint(120, 300),
+        "labels": [{"name": rng.choice(LABEL_NAMES), "type": "label"}],
+        "artists": [{"uuid": get_uuid("artist", f"{song_uuid}-{i}"), "name": f"Artist {song_uuid[:6]} {i}"}
+                    for i in range(artist_count)],
+        "genres": [{"root": root, "sub": subs}],
+        "audio": {"instrumentalness": round(rng.random(), 3)},
+    }
+
+
+def get_song_total_streams(song_uuid: str, day: date) -> int:
+    """
+    Streams grow linearly day by day from the release date, so the total has a closed form.
+    """
+    rng = get_rng("streams", song_uuid)
+    release_date = date.fromisoformat(get_song_object(song_uuid)["releaseDate"][:10])
+    base = rng.randint(10, 20_000)
+    trend = rng.uniform(-0.001, 0.02)
+    days = (day - release_date).days + 1
+    if days <= 0:
+        return 0
+    return max(0, int(base * (days + trend * days * (days - 1) / 2)))
+
+
+def get_day_range(query: dict[str, str], default_days: int = 90) -> list[date]:
+    end = parse_day(query.get("endDate"), date.today())
+    start = parse_day(query.get("startDate"), end - timedelta(days=default_days - 1))
+    return [end - timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def song_audience(match, query, config):
+    song_uuid = match["uuid"]
+    days = get_day_range(query)
+    return {"items": [{"date": to_datetime_string(day), "plots": [{"value": get_song_total_streams(song_uuid, day),
+                                                                   "identifier": song_uuid}]}
+                      for day in days]}
+
+
+def song_metadata(match, query, config):
+    return {"type": "song", "object": get_song_object(match["uuid"])}
+
+
+def song_identifiers(match, query, config):
+    identifier = hashlib.sha1(match["uuid"].encode("utf-8")).hexdigest()[:22]
+    return paginate(match["path"], query, [{"platformCode": "spotify", "identifier": identifier,
+                                            "url": f"https://open.spotify.com/track/{identifier}"}])
+
+
+def artist_retention(match, query, config):
+    rng = get_rng("retention", match["uuid"])
+    followers = rng.randint(0, 2_000_000)
+    listeners = rng.randint(100, 5_000_000)
+    return {"items": [{"date": to_datetime_string(date.today()), "followers": followers, "listeners": listeners,
+                       "conversionRate": round(followers / listeners, 4)}]}
+
+
+def artist_audience(match, query, config):
+    rng = get_rng("audience", match["uuid"], match["platform"])
+    return {"items": [{"date": to_datetime_string(date.today()), "followerCount": rng.randint(0, 1_000_000)}]}
+
+
+def artist_related(match, query, config):
+    items = []
+    for i in range(config.related_artists):
+        related_uuid = get_uuid("artist", f"{match['uuid']}-related-{i % 50}")
+        items.append({"uuid": related_uuid, "name": f"Artist {related_uuid[:6]}", "slug": related_uuid[:8],
+                      "appUrl": f"https://app.soundcharts.com/app/artist/{related_uuid}", "imageUrl": None})
+    return paginate(match["path"], query, items)
+
+
+def artist_streaming(match, query, config):
+    rng = get_rng("listening", match["uuid"])
+    base = rng.randint(1_000, 10_000_000)
+    days = sorted(get_day_range(query, default_days=365))
+    return {"items": [{"date": to_datetime_string(day), "value": base + (day.toordinal() % 365) * 1000}
+                      for day in days]}
+
+
+def chart_slugs(match, query, config):
+    platform = match["platform"]
+    country_code = query.get("countryCode", "global").lower()
+    items = [{"slug": f"{platform}-{genre}-{country_code}", "name": f"{genre} {country_code}"}
+             for genre in CHART_GENRES]
+    return paginate(match["path"], query, items)
+
+
+def chart_available_rankings(match, query, config):
+    return paginate(match["path"], query,
+                    [to_datetime_string(date.today() - timedelta(days=i)) for i in range(100)])
+
+
+def chart_ranking(match, query, config):
+    slug = match["slug"]
+    day = date.today() if match["date"] == "latest" else parse_day(match["date"], date.today())
+    items = []
+    for position in range(1, config.chart_size + 1):
+        rng = get_rng("chart", slug, day, position)
+        song_uuid = get_uuid("song", f"{slug}-{day.toordinal() - rng.randint(0, 30)}-{position}")
+        items.append({"song": {"uuid": song_uuid, "name": get_song_object(song_uuid)["name"]},
+                      "position": position, "timeOnChart": rng.randint(1, 60),
+                      "metric": rng.randint(1_000, 2_000_000)})
+
+    response = paginate(match["path"], query, items)
+    response["related"] = {"chart": {"slug": slug}, "date": to_datetime_string(day)}
+    return response
+
+
+def playlist_available_tracklistings(match, query, config):
+    end = parse_day(query.get("endDate"), date.today())
+    return paginate(match["path"], query, [to_datetime_string(end - timedelta(days=i)) for i in range(90)],
+                    default_limit=90)
+
+
+def playlist_tracks(match, query, config):
+    playlist_uuid = match["uuid"]
+    day = parse_day(match["date"], date.today())
+
+    # Each day the newest songs are added at the top and the oldest drop off the end
+    newest = day.toordinal() * config.playlist_daily_additions
+    items = [{"song": {"uuid": (song_uuid := get_uuid("song", f"{playlist_uuid}-{newest - i}")),
+                       "name": get_song_object(song_uuid)["name"]},
+              "position": i + 1}
+             for i in range(config.playlist_size)]
+
+    response = paginate(match["path"], query, items)
+    response["related"] = {"playlist": {"uuid": playlist_uuid, "name": f"Playlist {playlist_uuid[:6]}",
+                                        "platform": "spotify"},
+                           "date": to_datetime_string(day)}
+    return response
+
+
+def top_songs(match, query, config):
+    items = []
+    for position in range(config.ranking_size):
+        rng = get_rng("top", match["platform"], match["metric"], position)
+        song_uuid = get_uuid("song", f"top-{position}")
+        total = rng.randint(1_000, 1_000_000)
+        change = rng.randint(0, total)
+        items.append({"song": {"uuid": song_uuid, "name": get_song_object(song_uuid)["name"],
+                               "creditName": f"Artist {song_uuid[:6]}"},
+                      "total": total, "change": change, "percent": round(change / total * 100, 2)})
+
+    response = paginate(match["path"], query, items)
+    updated_at = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    response["related"] = {"updatedAt": updated_at.isoformat()}
+    return response
+
+
+ROUTES = [
+    (re.compile(r"^/v2\.25/song/(?P<uuid>[^/]+)$"), song_metadata),
+    (re.compile(r"^/v2/song/(?P<uuid>[^/]+)/audience/(?P<platform>[^/]+)$"), song_audience),
+    (re.compile(r"^/v2/song/(?P<uuid>[^/]+)/identifiers$"), song_identifiers),
+    (re.compile(r"^/v2/artist/(?P<uuid>[^/]+)/spotify/retention$"), artist_retention),
+    (re.compile(r"^/v2/artist/(?P<uuid>[^/]+)/audience/(?P<platform>[^/]+)$"), artist_audience),
+    (re.compile(r"^/v2/artist/(?P<uuid>[^/]+)/related$"), artist_related),
+    (re.compile(r"^/v2/artist/(?P<uuid>[^/]+)/streaming/(?P<platform>[^/]+)/listening$"), artist_streaming),
+    (re.compile(r"^/v2/chart/song/by-platform/(?P<platform>[^/]+)$"), chart_slugs),
+    (re.compile(r"^/v2/chart/song/(?P<slug>[^/]+)/available-rankings$"), chart_available_rankings),
+    (re.compile(r"^/v2\.14/chart/song/(?P<slug>[^/]+)/ranking/(?P<date>[^/]+)$"), chart_ranking),
+    (re.compile(r"^/v2\.20/playlist/(?P<uuid>[^/]+)/available-tracklistings$"), playlist_available_tracklistings),
+    (re.compile(r"^/v2\.20/playlist/(?P<uuid>[^/]+)/tracks/(?P<date>[^/]+)$"), playlist_tracks),
+    (re.compile(r"^/v2/top-song/(?P<platform>[^/]+)/(?P<metric>[^/]+)$"), top_songs),
+]
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: StubConfig
+    state: StubState
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.removeprefix("/api")
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        time.sleep(max(0.0, random.gauss(self.config.latency, self.config.latency_jitter)))
+
+        status, quota_remaining = self.state.admit()
+        if status == 429:
+            self.send_json(429, {"errors": [{"code": 429, "message": "Too many requests"}]}, quota_remaining,
+                           {"Retry-After": "1"})
+            return
+
+        if random.random() < self.config.failure_rate:
+            self.send_json(500, {"errors": [{"code": 500, "message": "Injected failure"}]}, quota_remaining)
+            return
+
+        for pattern, handler in ROUTES:
+            match = pattern.match(path)
+            if match:
+                body = handler({**match.groupdict(), "path": path}, query, self.config)
+                self.send_json(200, body, quota_remaining)
+                return
+
+        self.send_json(404, {"errors": [{"code": 404, "message": f"No stub for {path}"}]}, quota_remaining)
+
+    def send_json(self, status: int, body: dict, quota_remaining: int, headers: dict | None = None) -> None:
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("X-Quota-Remaining", str(quota_remaining))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Logging every request would dominate a load test
+        pass
+
+
+def start_stub_server(config: StubConfig, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Start the stub server on a background thread, use port 0 to pick a free port.
+    """
+    handler = type("ConfiguredStubRequestHandler", (StubRequestHandler,),
+                   {"config": config, "state": StubState(config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logger.info(f"Soundcharts stub server listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Soundcharts API stub serving synthetic data, set API_URL=http://<host>:<port> to use it")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=StubConfig.latency, help="Mean latency in seconds")
+    parser.add_argument("--latency-jitter", type=float, default=StubConfig.latency_jitter)
+    parser.add_argument("--rate-limit", type=int, default=StubConfig.rate_limit, help="Requests per second")
+    parser.add_argument("--quota", type=int, default=StubConfig.quota)
+    parser.add_argument("--failure-rate", type=float, default=StubConfig.failure_rate)
+    parser.add_argument("--chart-size", type=int, default=StubConfig.chart_size)
+    parser.add_argument("--playlist-size", type=int, default=StubConfig.playlist_size)
+    parser.add_argument("--ranking-size", type=int, default=StubConfig.ranking_size)
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, latency_jitter=args.latency_jitter, rate_limit=args.rate_limit,
+                        quota=args.quota, failure_rate=args.failure_rate, chart_size=args.chart_size,
+                        playlist_size=args.playlist_size, ranking_size=args.ranking_size)
+    server = start_stub_server(config, args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import pandas as pd
+import requests
+
+from src import filters, input_lists
+from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates
+
+INPUTS = {
+    "max_streams": 1_000_000,
+    "max_spotify_followers": 50_000,
+    "minimum_spotify_followers_if_100k_monthly_listeners": 1_000,
+    "min_average_streams_if_above_0": 100,
+    "max_tiktok_followers": 100_000,
+}
+
+
+def test_tiktok_filter_keeps_songs_of_artists_whose_followers_failed(monkeypatch):
+    for name, value in INPUTS.items():
+        # Set in the module dict so the inputs worksheet is never read
+        monkeypatch.setitem(vars(input_lists), name, value)
+
+    tiktok_followers = {"artist-small": 10, "artist-large": 500_000}
+
+    def get_artist_audience(artist_uuid, platform):
+        if artist_uuid not in tiktok_followers:
+            raise requests.exceptions.RetryError("Max retries exceeded")
+        return tiktok_followers[artist_uuid]
+
+    monkeypatch.setattr(filters, "get_artist_audience", get_artist_audience)
+    df = pd.DataFrame({
+        "song_uuid": ["a", "b", "c"],
+        "url": ["url-a", "url-b", "url-c"],
+        "main_artist_uuid": ["artist-small", "artist-large", "artist-failing"],
+        "total_streams": [1_000, 1_000, 1_000],
+        "today_streams": [30, 20, 10],
+        "day_1-3_average": [0, 0, 0],
+        "main_artist_spotify_followers": [100, 100, 100],
+        "main_artist_spotify_monthly_listeners": [1_000, 1_000, 1_000],
+    })
+
+    filtered_df = apply_follower_stream_listeners_filters_and_drop_duplicates(df)
+
+    assert filtered_df["song_uuid"].to_list() == ["a", "c"]
+    assert pd.isna(filtered_df.loc[filtered_df["song_uuid"] == "c", "main_artist_tiktok_followers"]).all()
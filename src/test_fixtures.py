@@ -0,0 +1,69 @@
+import gzip
+from datetime import date
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from src.fixtures import FixtureAdapter, FixtureStore, get_fixture_key
+
+
+class StaticAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers["Content-Type"] = "application/json"
+        response._content = f'{{"request": {self.sent}}}'.encode("utf-8")
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def prepare(url: str) -> requests.PreparedRequest:
+    return requests.Request("GET", url).prepare()
+
+
+def test_fixtures_replay_recorded_responses_in_order(tmp_path):
+    path = str(tmp_path / "fixtures.jsonl.gz")
+    inner = StaticAdapter()
+    recorder = FixtureAdapter(FixtureStore(path, "record"), inner=inner)
+    for _ in range(2):
+        recorder.send(prepare("http://api.test/v2/song/a"))
+    recorder.close()
+
+    replayer = FixtureAdapter(FixtureStore(path, "replay", latency=0))
+    bodies = [replayer.send(prepare("http://api.test/v2/song/a")).json() for _ in range(3)]
+
+    assert bodies == [{"request": 1}, {"request": 2}, {"request": 2}]
+    # Written as a single gzip member rather than one per response
+    assert gzip.open(path).read().count(b"\n") == 2
+
+
+def test_fixtures_replay_missing_request_raises(tmp_path):
+    path = str(tmp_path / "fixtures.jsonl.gz")
+    recorder = FixtureAdapter(FixtureStore(path, "record"), inner=StaticAdapter())
+    recorder.send(prepare("http://api.test/v2/song/a"))
+    recorder.close()
+
+    replayer = FixtureAdapter(FixtureStore(path, "replay", latency=0))
+    with pytest.raises(requests.ConnectionError, match="No recorded response"):
+        replayer.send(prepare("http://api.test/v2/song/b"))
+
+
+def test_fixture_key_counts_relative_dates_from_today():
+    recorded = prepare("http://api.test/v2/song/a/audience/spotify?startDate=2024-05-01&endDate=2024-05-10")
+    replayed = prepare("http://api.test/v2/song/a/audience/spotify?startDate=2024-06-01&endDate=2024-06-10")
+
+    assert get_fixture_key(recorded, today=date(2024, 5, 10)) == get_fixture_key(replayed, today=date(2024, 6, 10))
+    assert get_fixture_key(recorded, today=date(2024, 5, 10)).endswith("startDate=today-9&endDate=today%2B0")
+    # Dates in the path come from earlier responses and are kept
+    assert get_fixture_key(prepare("http://api.test/v2/chart/top/2024-05-01")) == \
+        "GET http://api.test/v2/chart/top/2024-05-01"
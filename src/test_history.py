@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.history import HistoryWarehouse
+
+
+def make_row(song_uuid: str, artist_uuid: str = "artist-1") -> dict:
+    return {"song_uuid": song_uuid, "song_name": f"Song {song_uuid}", "main_artist": "Artist",
+            "main_artist_uuid": artist_uuid, "today_streams": np.int64(100), "total_streams": np.nan}
+
+
+def test_history_records_candidates_and_verdicts(tmp_path):
+    warehouse = HistoryWarehouse(str(tmp_path / "history.sqlite"))
+    for song_uuid in ("a", "b", "c"):
+        warehouse.record_candidate(make_row(song_uuid), "chart", "enriched", scrape_date="2024-05-01")
+    warehouse.record_candidate(make_row("a"), "chart", "enriched", scrape_date="2024-05-02")
+
+    warehouse.record_verdicts(["a"], "chart", "max_streams", scrape_date="2024-05-01")
+    warehouse.record_verdicts(["b"], "chart", "passed", scrape_date="2024-05-01")
+
+    assert warehouse.get_verdict_counts("2024-05-01") == {"enriched": 1, "max_streams": 1, "passed": 1}
+    song_history = warehouse.get_song_history("a")
+    assert song_history["scrape_date"].to_list() == ["2024-05-01", "2024-05-02"]
+    assert song_history["verdict"].to_list() == ["max_streams", "enriched"]
+    assert song_history["today_streams"].to_list() == [100, 100]
+    assert warehouse.count_artist_appearances("artist-1", since="2024-05-02") == 1
+
+
+def test_history_recording_a_candidate_again_keeps_one_row(tmp_path):
+    warehouse = HistoryWarehouse(str(tmp_path / "history.sqlite"))
+    warehouse.record_candidate(make_row("a"), "chart", "enriched", scrape_date="2024-05-01")
+    warehouse.record_verdicts(["a"], "chart", "passed", scrape_date="2024-05-01")
+    # e.g. a song restored from the journal by a restarted run, before its filters run again
+    warehouse.record_candidates([make_row("a")], "chart", "enriched", scrape_date="2024-05-01")
+
+    assert warehouse.get_verdict_counts("2024-05-01") == {"enriched": 1}
+
+
+def test_history_writes_in_batches(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    warehouse = HistoryWarehouse(path, flush_rows=2)
+    reader = HistoryWarehouse(path)
+
+    warehouse.record_candidate(make_row("a"), "playlist", "enriched", scrape_date="2024-05-01")
+    assert reader.get_verdict_counts("2024-05-01") == {}
+
+    warehouse.record_candidate(make_row("b"), "playlist", "enriched", scrape_date="2024-05-01")
+    assert reader.get_verdict_counts("2024-05-01") == {"enriched": 2}
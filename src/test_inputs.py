@@ -159,3 +159,4 @@ def test_is_english():
     assert is_english('Вор замочек открывает') is False  # Russian
 
     print("All tests passed!")
+
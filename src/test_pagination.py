@@ -0,0 +1,50 @@
+from urllib.parse import urlsplit, parse_qs
+
+from src import pagination
+from src.pagination import iter_pages, set_offset_and_limit
+
+
+def get_offset(url: str) -> int:
+    return int(parse_qs(urlsplit(url).query)["offset"][0])
+
+
+def test_set_offset_and_limit_replaces_existing_values():
+    url = set_offset_and_limit("http://api.test/v2/chart?offset=5&limit=10&sortBy=rank", 200, 100)
+
+    assert parse_qs(urlsplit(url).query) == {"sortBy": ["rank"], "offset": ["200"], "limit": ["100"]}
+
+
+def test_iter_pages_fetches_every_offset_in_order(monkeypatch):
+    fetched = []
+
+    def fetch_page(url):
+        fetched.append(get_offset(url))
+        return {"items": [get_offset(url)], "page": {"total": 250}}
+
+    monkeypatch.setattr(pagination, "fetch_page", fetch_page)
+
+    pages = list(iter_pages("http://api.test/v2/chart", limit=100))
+
+    assert [page["items"] for page in pages] == [[0], [100], [200]]
+    assert sorted(fetched) == [0, 100, 200]
+
+
+def test_iter_pages_stops_at_max_pages(monkeypatch):
+    monkeypatch.setattr(pagination, "fetch_page", lambda url: {"items": [get_offset(url)], "page": {"total": 1000}})
+
+    pages = list(iter_pages("http://api.test/v2/chart", limit=100, max_pages=2))
+
+    assert [page["items"] for page in pages] == [[0], [100]]
+
+
+def test_iter_pages_follows_next_links_without_a_total(monkeypatch):
+    responses = {
+        "http://api.test/v2/ranking?offset=0&limit=100": {"items": [1], "page": {"next": "/api/v2/ranking?page=2"}},
+        "http://api.test/v2/ranking?page=2": {"items": [2], "page": {"next": "/api/v2/ranking?page=3"}},
+        "http://api.test/v2/ranking?page=3": {"items": [3], "page": {"next": None}},
+    }
+    monkeypatch.setattr(pagination, "BASE_API_URL", "http://api.test")
+    monkeypatch.setattr(pagination, "fetch_page", lambda url: responses[url])
+
+    assert [page["items"] for page in iter_pages("http://api.test/v2/ranking")] == [[1], [2], [3]]
+    assert [page["items"] for page in iter_pages("http://api.test/v2/ranking", max_pages=2)] == [[1], [2]]
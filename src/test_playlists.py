@@ -0,0 +1,24 @@
+import pandas as pd
+
+from src.playlists import playlists
+from src.playlists.playlists import convert_tracklist_to_df, get_songs_added_to_playlist_in_last_day
+
+
+def make_tracklist_df(crawl_date: str, song_uuids: list[str]) -> pd.DataFrame:
+    columns = {"song_name": [f"Song {uuid}" for uuid in song_uuids], "song_uuid": song_uuids,
+               "position": list(range(1, len(song_uuids) + 1))}
+    related = {"playlist": {"name": "New Music", "uuid": "playlist-1", "platform": "spotify"}, "date": crawl_date}
+    return convert_tracklist_to_df(columns, related)
+
+
+def test_get_songs_added_to_playlist_in_last_day_with_categorical_tracklists(monkeypatch):
+    today_df = make_tracklist_df("2023-10-10T00:00:00+00:00", ["1", "2", "3"])
+    yesterday_df = make_tracklist_df("2023-10-09T00:00:00+00:00", ["1", "2"])
+    monkeypatch.setattr(playlists, "get_tracklist_df_for_today_and_yesterday_and_playlist_info",
+                        lambda uuid: (today_df, yesterday_df))
+
+    new_songs_df = get_songs_added_to_playlist_in_last_day("playlist-1")
+
+    assert new_songs_df["song_uuid"].to_list() == ["3"]
+    assert all(new_songs_df["date_added"] == pd.Timestamp("2023-10-10").date())
+    assert isinstance(new_songs_df["playlist_name"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,26 @@
+from src.quota import QuotaTracker
+
+
+def test_quota_tracker_only_counts_lower_readings(tmp_path):
+    tracker = QuotaTracker(str(tmp_path / "quota.txt"), flush_interval=3600)
+
+    assert tracker.update(1_000) == 0
+    assert tracker.update(990) == 10
+    # A response that started earlier can arrive with an older, higher reading
+    assert tracker.update(995) == 0
+    assert tracker.update(985) == 5
+
+    assert tracker.remaining == 985
+    assert tracker.consumed == 15
+    assert tracker.summary()["quota_consumed"] == 15
+
+
+def test_quota_tracker_flushes_the_lowest_reading(tmp_path):
+    path = tmp_path / "quota.txt"
+    tracker = QuotaTracker(str(path), flush_interval=0)
+
+    tracker.update(500)
+    tracker.update(450)
+
+    assert path.read_text() == "450"
+    assert not (tmp_path / "quota.txt.tmp").exists()
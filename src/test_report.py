@@ -0,0 +1,18 @@
+import pandas as pd
+
+from src.report import combine_song_dataframes
+
+
+def test_combine_song_dataframes():
+    song_a_df = pd.DataFrame({"date": ["2023-10-02", "2023-10-01"], "daily_streams": [20.0, 10.0]}).set_index("date")
+    song_b_df = pd.DataFrame({"date": ["2023-10-03", "2023-10-02"], "daily_streams": [5.0, 1.0]}).set_index("date")
+
+    result_df = combine_song_dataframes({"a": song_a_df, "b": song_b_df}, {"a": "Song A", "b": "Song B"})
+
+    assert list(result_df.index) == ["2023-10-01", "2023-10-02", "2023-10-03"]
+    assert list(result_df.columns) == ["Song A daily_streams", "Song B daily_streams", "cumulative_daily_streams",
+                                       "total_streams"]
+    assert result_df["cumulative_daily_streams"].to_list() == [10.0, 21.0, 5.0]
+    assert result_df["total_streams"].to_list() == [10.0, 31.0, 36.0]
+    assert pd.isna(result_df.loc["2023-10-01", "Song B daily_streams"])
+
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from src import result_store
+from src.result_store import read_results, write_results
+
+
+def make_results(song_uuids: list[str]) -> pd.DataFrame:
+    return pd.DataFrame({"song_uuid": song_uuids, "today_streams": ["N/A"] + [100] * (len(song_uuids) - 1),
+                         "date_added": ["2024-05-01"] * len(song_uuids)})
+
+
+def test_write_results_replaces_the_day(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "get_result_dataset_folder", lambda: str(tmp_path / "results"))
+
+    write_results(make_results(["a", "b"]), "chart", "2024-05-01")
+    write_results(make_results(["c"]), "chart", "2024-05-01")
+    write_results(make_results(["d"]), "chart", "2024-05-02")
+    write_results(make_results(["e"]), "playlist", "2024-05-01")
+
+    results = read_results("chart", start_date="2024-05-01", end_date="2024-05-01")
+
+    assert results["song_uuid"].to_list() == ["c"]
+    assert pd.isna(results.loc[0, "today_streams"])
+
+
+def test_write_results_with_key_keeps_other_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "get_result_dataset_folder", lambda: str(tmp_path / "results"))
+
+    write_results(make_results(["a"]).assign(start_day="2024-04-01"), "playlist_history", "2024-05-01",
+                  key="2024-04-01")
+    write_results(make_results(["b"]).assign(start_day="2024-04-24"), "playlist_history", "2024-05-01",
+                  key="2024-04-24")
+    write_results(make_results(["c"]).assign(start_day="2024-04-24"), "playlist_history", "2024-05-01",
+                  key="2024-04-24")
+
+    results = read_results("playlist_history").sort_values("song_uuid")
+
+    assert results["song_uuid"].to_list() == ["a", "c"]
+    assert results["start_day"].astype(str).to_list() == ["2024-04-01", "2024-04-24"]
@@ -0,0 +1,28 @@
+from src.run_journal import RunJournal
+
+
+def test_run_journal_resumes_finished_entries(tmp_path):
+    path = str(tmp_path / "run.jsonl")
+    journal = RunJournal(path)
+    journal.record("chart", "top-200:a", [{"song_uuid": "a", "today_streams": 10}])
+    journal.record("chart", "top-200:b", [])
+    journal.record("label_watchlist", "c", [{"song_uuid": "c"}])
+    journal.file.close()
+
+    resumed = RunJournal(path)
+
+    assert resumed.get("chart", "top-200:a") == [{"song_uuid": "a", "today_streams": 10}]
+    # Filtered out songs are finished with no rows, unlike songs that were never enriched
+    assert resumed.get("chart", "top-200:b") == []
+    assert resumed.get("chart", "top-200:d") is None
+    assert resumed.get_stage("label_watchlist") == [{"song_uuid": "c"}]
+
+
+def test_run_journal_skips_line_cut_short_by_crash(tmp_path):
+    path = tmp_path / "run.jsonl"
+    path.write_text('{"stage": "chart", "key": "a", "rows": []}\n{"stage": "chart", "ke', encoding="utf-8")
+
+    journal = RunJournal(str(path))
+
+    assert journal.get("chart", "a") == []
+    assert journal.get("chart", "b") is None
@@ -0,0 +1,9 @@
+def test_runner_imports():
+    """
+    The runner imports every scrape, so this fails when any stage module no longer imports.
+    """
+    import src.runner
+
+    assert [stage.name for stage in src.runner.get_scrape_stages()] == [
+        "playlist_fetch", "chart_fetch", "general_ranking_fetch", "playlist_publish", "chart_publish",
+        "general_ranking_publish", "label_watchlist"]
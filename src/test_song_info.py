@@ -0,0 +1,48 @@
+import pandas as pd
+
+from src import input_lists, song_info
+from src.run_journal import RunJournal
+from src.song_info import collect_watchlist_song
+from src.song_records import SongMetadata, SongMetrics
+from src.watchlist import WatchlistCollector
+
+
+def make_song_metadata_record(song_uuid: str) -> SongMetadata:
+    return SongMetadata(song_uuid=song_uuid, song_name="Song", url="url", labels="Label", artists="Artist",
+                        main_artist="Artist", main_artist_uuid="artist", main_artist_spotify_followers=100,
+                        main_artist_spotify_monthly_listeners=1_000, main_artist_spotify_conversion_rate=0.1,
+                        instrumentalness=0.0, root_genres="", sub_genres="", release_date="2024-05-01", duration=180)
+
+
+def test_collect_watchlist_song_only_fetches_the_artist_of_songs_kept(tmp_path, monkeypatch):
+    monkeypatch.setitem(vars(input_lists), "max_streams", 1_000_000)
+    collector = WatchlistCollector()
+    journal = RunJournal(str(tmp_path / "run.jsonl"))
+    monkeypatch.setattr(song_info, "label_watchlist_collector", collector)
+    monkeypatch.setattr(song_info, "get_run_journal", lambda: journal)
+
+    total_streams = {"small": 1_000, "large": 5_000_000}
+    audience_calls = []
+    record_calls = []
+
+    def get_song_audience(song_uuid, platform):
+        audience_calls.append(song_uuid)
+        return pd.DataFrame({"song_uuid": [song_uuid]})
+
+    def get_song_metadata_record(song_metadata):
+        record_calls.append(song_metadata)
+        return make_song_metadata_record(song_metadata)
+
+    monkeypatch.setattr(song_info, "get_song_audience", get_song_audience)
+    monkeypatch.setattr(song_info, "get_song_metrics",
+                        lambda df, song_uuid: SongMetrics(total_streams=total_streams[song_uuid]))
+    monkeypatch.setattr(song_info, "get_song_metadata_record", get_song_metadata_record)
+
+    for song_uuid in ["small", "large", "small", "large"]:
+        # The song uuid stands in for its metadata
+        collect_watchlist_song(song_uuid, song_uuid)
+
+    assert audience_calls == ["small", "large"]
+    assert record_calls == ["small"]
+    assert [row["song_uuid"] for row in collector.get_rows()] == ["small"]
+    assert journal.get("label_watchlist", "large") == []
@@ -0,0 +1,16 @@
+import pandas as pd
+
+from src.song_records import SongRowBuffer
+
+
+def test_song_row_buffer():
+    song_rows = SongRowBuffer()
+    song_rows.append({"song_uuid": "a", "today_streams": 10})
+    song_rows.extend([{"song_uuid": "b", "chart_slug": "top-200"}, {"song_uuid": "c", "today_streams": 30}])
+
+    result_df = song_rows.to_df()
+
+    assert list(result_df.columns) == ["song_uuid", "today_streams", "chart_slug"]
+    assert result_df["song_uuid"].to_list() == ["a", "b", "c"]
+    assert pd.isna(result_df.loc[1, "today_streams"])
+    assert pd.isna(result_df.loc[0, "chart_slug"]) and pd.isna(result_df.loc[2, "chart_slug"])
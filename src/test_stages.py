@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from src.stages import Stage, run_stages
+
+
+def test_run_stages_passes_inputs_and_orders_dependencies():
+    finished = []
+
+    def stage(name, value):
+        def func(*args):
+            finished.append(name)
+            return value + sum(args)
+        return func
+
+    stages = [
+        Stage("publish", stage("publish", 100), inputs=["fetch_a", "fetch_b"], after=["setup"]),
+        Stage("fetch_a", stage("fetch_a", 1)),
+        Stage("fetch_b", stage("fetch_b", 2), main_thread=True),
+        Stage("setup", stage("setup", 0)),
+    ]
+
+    results, timings = run_stages(stages)
+
+    assert results == {"fetch_a": 1, "fetch_b": 2, "setup": 0, "publish": 103}
+    assert set(timings) == {"fetch_a", "fetch_b", "setup", "publish"}
+    assert finished[-1] == "publish"
+
+
+def test_run_stages_runs_independent_stages_concurrently():
+    # Each stage waits for the other, so this only finishes if both run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [Stage("a", barrier.wait), Stage("b", barrier.wait)]
+
+    results, _ = run_stages(stages)
+
+    assert set(results) == {"a", "b"}
+
+
+def test_run_stages_rejects_unknown_and_circular_dependencies():
+    with pytest.raises(ValueError, match="unknown"):
+        run_stages([Stage("a", lambda: None, after=["missing"])])
+
+    with pytest.raises(ValueError, match="circular"):
+        run_stages([Stage("a", lambda: None, after=["b"]), Stage("b", lambda: None, after=["a"])])
+
+
+def test_run_stages_raises_the_error_of_a_failed_stage():
+    def fail():
+        raise RuntimeError("fetch failed")
+
+    with pytest.raises(RuntimeError, match="fetch failed"):
+        run_stages([Stage("fetch", fail), Stage("publish", lambda result: result, inputs=["fetch"])])
@@ -0,0 +1,93 @@
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from src import transport
+from src.transport import CircuitBreaker, CircuitBreakers, CircuitOpenError, TransportAdapter, CLOSED, OPEN, HALF_OPEN
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(transport.time, "monotonic", clock)
+    return clock
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("GET /v2/artist/{uuid}/spotify/retention", failure_threshold=3, cooldown=60)
+
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    breaker.before_request()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert breaker.trips == 1
+    assert breaker.short_circuited == 1
+
+
+def test_circuit_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker("GET /v2/artist/{uuid}/audience/tiktok", failure_threshold=1, cooldown=60)
+    breaker.before_request()
+    breaker.record_failure()
+
+    clock.now += 60
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    # Only the probe goes through while it is in flight
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    clock.now += 60
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_request()
+    assert breaker.trips == 1
+
+
+def test_transport_adapter_short_circuits_failing_endpoint(clock, monkeypatch):
+    sent = []
+
+    def send(self, request, **kwargs):
+        sent.append(request.url)
+        response = requests.Response()
+        response.status_code = 503 if "retention" in request.url else 200
+        return response
+
+    monkeypatch.setattr(HTTPAdapter, "send", send)
+    breakers = CircuitBreakers(failure_threshold=2, cooldown=60)
+    adapter = TransportAdapter(breakers=breakers)
+
+    def get(url):
+        return adapter.send(requests.Request("GET", url).prepare())
+
+    for uuid in ("11111111-1111-1111-1111-111111111111", "22222222-2222-2222-2222-222222222222"):
+        get(f"http://api.test/v2/artist/{uuid}/spotify/retention")
+    # Every artist shares the circuit of the endpoint
+    with pytest.raises(CircuitOpenError):
+        get("http://api.test/v2/artist/33333333-3333-3333-3333-333333333333/spotify/retention")
+    assert get("http://api.test/v2/artist/33333333-3333-3333-3333-333333333333/audience/tiktok").status_code == 200
+
+    assert len(sent) == 3
+    assert breakers.summary() == {"circuit_breaker_trips": {
+        "GET /v2/artist/{uuid}/spotify/retention": {"trips": 1, "short_circuited": 1, "state": OPEN}}}
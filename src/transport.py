@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.instrumentation import get_endpoint_name
+from src.logging_config import logger
+
+load_dotenv()
+
+# Threads enriching songs in each stage, defined here as the connection pool is sized for them
+ENRICHMENT_MAX_WORKERS = 10
+# Up to four stages run at once, each with its own pool of enrichment workers, so every worker keeps a kept alive
+# connection rather than the pool discarding and re-handshaking them
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 4 * ENRICHMENT_MAX_WORKERS))
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", 3))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", 0.5))
+HTTP_BACKOFF_JITTER = float(os.getenv("HTTP_BACKOFF_JITTER", 0.5))
+# Seconds to connect and to wait for a response, for requests made without a timeout
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 30))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Failed requests in a row, after their retries, before an endpoint is short circuited
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+# Seconds an open circuit short circuits its endpoint before letting a probe request through
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", 60))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of sending a request to an endpoint whose circuit is open.
+    """
+
+
+def get_retry_policy() -> Retry:
+    """
+    Jittered exponential retries of connection errors, read timeouts and the transient statuses. Once the retries run
+    out a transient status raises requests.exceptions.RetryError instead of being returned, so callers can tell an
+    outage from a song without data.
+    """
+    return Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=HTTP_RETRIES,
+        status=HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        backoff_jitter=HTTP_BACKOFF_JITTER,
+        respect_retry_after_header=True,
+        raise_on_status=True,
+    )
+
+
+class CircuitBreaker:
+    """
+    Circuit of a single endpoint. It opens after failure_threshold failures in a row and short circuits every call
+    for the cooldown, then lets a single probe through half open, which closes it again or reopens it.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown: float = CIRCUIT_COOLDOWN):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.short_circuited = 0
+
+    def before_request(self) -> None:
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                # This call is the probe, the others keep being short circuited until it completes
+                self.state = HALF_OPEN
+                return
+            if self.state != CLOSED:
+                self.short_circuited += 1
+                raise CircuitOpenError(f"Circuit open for {self.endpoint}")
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.state == HALF_OPEN:
+                logger.info(f"Circuit closed for {self.endpoint}")
+            self.state = CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state == CLOSED:
+                    self.trips += 1
+                    logger.warning(f"Circuit opened for {self.endpoint} after {self.consecutive_failures} "
+                                   f"failures, short circuiting it for {self.cooldown:.0f}s")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class CircuitBreakers:
+    """
+    A circuit breaker per endpoint, grouped like the instrumentation so every song uuid shares one circuit.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, cooldown: float = CIRCUIT_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.cooldown)
+            return self.breakers[endpoint]
+
+    def summary(self) -> dict:
+        with self.lock:
+            tripped = [breaker for breaker in self.breakers.values() if breaker.trips]
+        return {
+            "circuit_breaker_trips": {breaker.endpoint: {"trips": breaker.trips,
+                                                         "short_circuited": breaker.short_circuited,
+                                                         "state": breaker.state}
+                                      for breaker in tripped},
+        }
+
+
+circuit_breakers = CircuitBreakers()
+
+
+class TransportAdapter(HTTPAdapter):
+    """
+    HTTP adapter with a connection pool sized for the enrichment workers, retries, a default timeout and a circuit
+    breaker per endpoint. A request fails its circuit when it raises or returns a transient status after its retries.
+    """
+
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE,
+                 timeout: tuple[float, float] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+                 breakers: CircuitBreakers = circuit_breakers):
+        self.timeout = timeout
+        self.breakers = breakers
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                         max_retries=get_retry_policy())
+
+    def send(self, request, timeout=None, **kwargs):
+        breaker = self.breakers.get(get_endpoint_name(request.method, request.url))
+        breaker.before_request()
+
+        try:
+            response = super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        if response.status_code in RETRY_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
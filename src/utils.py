@@ -1,8 +1,5 @@
-import os
 from typing import List
 
-import requests
-
 from src import input_lists
 from src.logging_config import logger
 from dotenv import load_dotenv
@@ -44,26 +41,6 @@ def process_future(future, result_list):
         result_list.append(stats)
 
 
-def get_remaining_api_quota_from_headers_and_update_remaining_quota(response: requests.Response) -> int:
-    try:
-        quota = response.headers.get("X-Quota-Remaining")
-        quota = int(quota)
-        update_quota_in_file(quota)
-        return quota
-    except Exception as e:
-        logger.debug(f"Failed to update quota {e}")
-        return 0
-
-
-def update_quota_in_file(quota: int):
-
-
-    LOGS_FOLDER = os.getenv("LOGS_FOLDER")
-    file_path = f"{LOGS_FOLDER}/quota.txt"
-    with open(file=file_path, mode="w") as f:
-        f.write(str(quota))
-
-
 def extract_label_list_from_song_metadata(song_metadata):
     if song_metadata:
         song_label = [label["name"] for label in song_metadata.labels]
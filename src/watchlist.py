@@ -1,10 +1,60 @@
+import os
+import threading
+
 import pandas as pd
 
 from src.filters import apply_follower_stream_listeners_filters_and_drop_duplicates
 from src.logging_config import logger
-from src.sheets_utils import get_watchlist_sheet_as_df_and_concat
+from src.sheets_utils import append_new_songs_to_watchlist_worksheet
+
+
+class WatchlistCollector:
+    """
+    Thread safe collection of the label watchlist songs found during a run, keyed by song uuid so a song on several
+    charts or playlists is only fetched and added once.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows: dict[str, dict | None] = {}
+
+    def __len__(self) -> int:
+        with self.lock:
+            return sum(row is not None for row in self.rows.values())
+
+    def claim(self, song_uuid: str) -> bool:
+        """
+        Reserve the song for the calling thread, False if it is already collected or being collected.
+        """
+        with self.lock:
+            if song_uuid in self.rows:
+                return False
+            self.rows[song_uuid] = None
+            return True
+
+    def release(self, song_uuid: str) -> None:
+        """
+        Drop a claim whose row could not be built, so a later appearance of the song can collect it.
+        """
+        with self.lock:
+            if self.rows.get(song_uuid) is None:
+                self.rows.pop(song_uuid, None)
+
+    def add(self, song_uuid: str, row: dict) -> None:
+        with self.lock:
+            self.rows[song_uuid] = row
+
+    def extend(self, rows: list[dict]) -> None:
+        with self.lock:
+            for row in rows:
+                self.rows.setdefault(row["song_uuid"], row)
+
+    def get_rows(self) -> list[dict]:
+        with self.lock:
+            return [row for row in self.rows.values() if row is not None]
+
 
-global_label_watchlist_df_list = []
+label_watchlist_collector = WatchlistCollector()
 
 watchlist_columns = [
     'date_added_to_watchlist',
@@ -35,19 +85,22 @@ watchlist_columns = [
 ]
 
 
-def concat_filter_process_label_watchlist_df(watchlist_song_df_list) -> pd.DataFrame:
-    if not watchlist_song_df_list:
+def concat_filter_process_label_watchlist_df(collector: WatchlistCollector) -> pd.DataFrame:
+    watchlist_song_rows = collector.get_rows()
+    if not watchlist_song_rows:
         logger.info("No songs in watchlist")
         return pd.DataFrame()
 
-    watchlist_df = pd.concat(watchlist_song_df_list, ignore_index=True)
+    watchlist_df = pd.DataFrame(watchlist_song_rows)
     watchlist_df = apply_follower_stream_listeners_filters_and_drop_duplicates(watchlist_df)
 
     # Set the date_added_to_watchlist column to the current date
     watchlist_df["date_added_to_watchlist"] = pd.Timestamp.now().date()
     watchlist_df = watchlist_df[watchlist_columns]
 
-    watchlist_df = get_watchlist_sheet_as_df_and_concat(watchlist_df)
+    LOGS_FOLDER = os.getenv("LOGS_FOLDER")
+    watchlist_df = append_new_songs_to_watchlist_worksheet(watchlist_df,
+                                                           mirror_path=f"{LOGS_FOLDER}/label_watchlist_uuids.json")
 
     # DF containing new songs added to watchlist
     return watchlist_df